@@ -0,0 +1,268 @@
+"""Local fake of the Drivvo API, with fault injection.
+
+The fake runs in process, or as its own process so that serving the
+histories does not weigh on the measurements of a benchmark:
+
+    python benchmarks/fake_drivvo.py --vehicles 10 --records 1000
+
+prints the URL it serves on, then runs until interrupted.
+
+The histories are served newest first by default, as the Drivvo API
+returns them; --order shuffled or ascending serves them otherwise.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import json
+import random
+import zlib
+
+from aiohttp import web
+
+from common import generate_refuellings
+
+ORDERS = ("descending", "shuffled", "ascending")
+
+
+@dataclasses.dataclass
+class Faults:
+    """Faults injected in the GET responses of the fake API."""
+
+    # Share of requests answered with error_status
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Value of the Retry-After header sent with the errors, if any
+    retry_after: float | None = None
+    # Added to every response, in seconds
+    latency: float = 0.0
+
+
+@dataclasses.dataclass
+class FakeVehicle:
+    """A vehicle of the fake account and its histories."""
+
+    id: int
+    refuellings: list[dict]
+    services: list[dict] = dataclasses.field(default_factory=list)
+    expenses: list[dict] = dataclasses.field(default_factory=list)
+
+    def as_api(self) -> dict:
+        """Return the vehicle as the API describes it."""
+        return {
+            "id": self.id,
+            "id_veiculo": self.id,
+            "nome": f"Vehicle {self.id}",
+            "placa": f"ABC{self.id:04d}",
+            "marca": "Volkswagen",
+            "modelo": "Gol",
+            "unidade_distancia": 1,
+            "ativo": True,
+        }
+
+
+def generate_fleet(
+    vehicles: int,
+    refuellings: int,
+    seed: int = 0,
+    services_every: int = 25,
+    expenses_every: int = 40,
+    order: str = "descending",
+) -> list[FakeVehicle]:
+    """Return a fleet of vehicles with synthetic histories.
+
+    Every vehicle gets a service every services_every refuellings and an
+    expense every expenses_every refuellings, at the same date and odometer.
+    The histories are listed in the given date order, one of ORDERS.
+    """
+    rng = random.Random(seed)
+    fleet = []
+    for index in range(vehicles):
+        history = generate_refuellings(refuellings, seed=seed + index)
+        services = [
+            {
+                "id": record["id"],
+                "data": record["data"],
+                "odometro": record["odometro"],
+                "valor_total": 150.0,
+                "tipo_servico": {"nome": "Troca de óleo"},
+            }
+            for record in history[::services_every]
+        ]
+        expenses = [
+            {
+                "id": record["id"],
+                "data": record["data"],
+                "odometro": record["odometro"],
+                "valor_total": 95.5,
+                "tipo_despesa": {"nome": "Estacionamento"},
+            }
+            for record in history[::expenses_every]
+        ]
+        for records in (history, services, expenses):
+            if order == "descending":
+                records.reverse()
+            elif order == "shuffled":
+                rng.shuffle(records)
+        fleet.append(FakeVehicle(index + 1, history, services, expenses))
+    return fleet
+
+
+class FakeDrivvo:
+    """aiohttp application answering like the Drivvo API."""
+
+    def __init__(self, fleet: list[FakeVehicle], faults: Faults | None = None) -> None:
+        """Initialize the fake API."""
+        self.fleet = {vehicle.id: vehicle for vehicle in fleet}
+        self.faults = faults or Faults()
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._rng = random.Random(0)
+        # The fleet never changes, so every payload is encoded once
+        self._bodies: dict[str, tuple[bytes, str]] = {}
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.post("/autenticacao/login", self._login),
+                web.get("/veiculo/web", self._vehicles),
+                web.get("/configuracao", self._config),
+                web.get("/_stats", self._stats),
+                web.get("/veiculo/{id}", self._vehicle),
+                web.get("/veiculo/{id}/{kind}/web", self._history),
+            ]
+        )
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    def stats(self) -> dict[str, int]:
+        """Return the request counters."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "not_modified": self.not_modified,
+            "bytes_sent": self.bytes_sent,
+        }
+
+    async def start(self, port: int = 0) -> None:
+        """Serve the API on a local port, a free one by default."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/"
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _login(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response({"token": "fake-token"})
+
+    def encode_all(self) -> None:
+        """Encode every payload up front, so no request pays for it."""
+        for vehicle in self.fleet.values():
+            paths = {
+                f"/veiculo/{vehicle.id}": vehicle.as_api(),
+                f"/veiculo/{vehicle.id}/abastecimento/web": vehicle.refuellings,
+                f"/veiculo/{vehicle.id}/servico/web": vehicle.services,
+                f"/veiculo/{vehicle.id}/despesa/web": vehicle.expenses,
+            }
+            for path, payload in paths.items():
+                body = json.dumps(payload).encode()
+                self._bodies[path] = (body, f'"{zlib.crc32(body):08x}"')
+
+    async def _respond(self, request: web.Request, payload) -> web.Response:
+        """Answer a GET, injecting the configured faults."""
+        self.requests += 1
+        faults = self.faults
+        if faults.latency:
+            await asyncio.sleep(faults.latency)
+        if self._rng.random() < faults.error_rate:
+            self.errors += 1
+            headers = {}
+            if faults.retry_after is not None:
+                headers["Retry-After"] = str(faults.retry_after)
+            return web.Response(status=faults.error_status, headers=headers)
+
+        cached = self._bodies.get(request.path)
+        if cached is None:
+            body = json.dumps(payload).encode()
+            cached = self._bodies[request.path] = (body, f'"{zlib.crc32(body):08x}"')
+        body, etag = cached
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        self.bytes_sent += len(body)
+        return web.Response(
+            body=body, content_type="application/json", headers={"ETag": etag}
+        )
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def _vehicles(self, request: web.Request) -> web.Response:
+        return await self._respond(
+            request, [vehicle.as_api() for vehicle in self.fleet.values()]
+        )
+
+    async def _config(self, request: web.Request) -> web.Response:
+        return await self._respond(request, [{"formato_valor": "R$"}])
+
+    async def _vehicle(self, request: web.Request) -> web.Response:
+        vehicle = self.fleet.get(int(request.match_info["id"]))
+        if vehicle is None:
+            raise web.HTTPNotFound
+        return await self._respond(request, vehicle.as_api())
+
+    async def _history(self, request: web.Request) -> web.Response:
+        vehicle = self.fleet.get(int(request.match_info["id"]))
+        if vehicle is None:
+            raise web.HTTPNotFound
+        histories = {
+            "abastecimento": vehicle.refuellings,
+            "servico": vehicle.services,
+            "despesa": vehicle.expenses,
+        }
+        return await self._respond(request, histories[request.match_info["kind"]])
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """Serve a generated fleet until cancelled."""
+    fleet = generate_fleet(
+        args.vehicles, args.records, seed=args.seed, order=args.order
+    )
+    fake = FakeDrivvo(fleet, Faults(latency=args.latency))
+    if not args.lazy:
+        fake.encode_all()
+        # Only the encoded bodies are needed from here on
+        for vehicle in fake.fleet.values():
+            vehicle.refuellings = vehicle.services = vehicle.expenses = []
+    await fake.start(args.port)
+    print(fake.url, flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Drivvo API.")
+    parser.add_argument("--vehicles", type=int, default=1)
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--order", choices=ORDERS, default=ORDERS[0])
+    parser.add_argument(
+        "--lazy", action="store_true", help="encode payloads on first request"
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,208 @@
+"""Benchmark the columnar refuelling aggregates against the old code path.
+
+The old code path computed the metrics from the decoded payload on every
+refresh. The columnar one merges the payload into the columns, then
+aggregates them. The speedup is that of a refresh finding one more
+refuelling at the head of the body, as the API lists them: only that
+record is read ("next merge ms"). The first refresh merges every record
+("first merge ms"), and so does one where an older refuelling was edited
+("edit merge ms"); both are one-off costs, slower than the old code path.
+
+Also times splitting the history into tank-to-tank segments, against
+updating them for one more refuelling, and indexing the running totals
+against answering the rolling windows from them.
+
+Run from the repository root:
+
+    python benchmarks/refuelling_aggregates.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import math
+import time
+import tracemalloc
+
+from common import generate_refuellings, load_module
+
+
+def legacy_refuelling_metrics(api_data_refuellings: list[dict]) -> dict:
+    """Refuelling metrics as get_data_vehicle computed them before."""
+    api_data_refuellings = sorted(
+        api_data_refuellings, key=lambda item: item["data"], reverse=True
+    )
+    result = {"total": 0}
+
+    refuelling_value_total = 0
+    refuelling_volume_total = 0
+    for refuelling in api_data_refuellings:
+        refuelling_value_total += refuelling["valor_total"]
+        if refuelling["volume"] != 0:
+            refuelling_volume_total += refuelling["volume"]
+        else:
+            refuelling_volume_total += refuelling["valor_total"] / refuelling["preco"]
+
+    refuellings_odometers = [
+        {
+            "odometro": refuelling["odometro"],
+            "data": refuelling["data"],
+            "volume": refuelling["volume"],
+            "tanque_cheio": refuelling["tanque_cheio"],
+            "preco": refuelling["preco"],
+            "valor_total": refuelling["valor_total"],
+        }
+        for refuelling in api_data_refuellings
+    ]
+
+    result["total"] = len(api_data_refuellings)
+    result["value_total"] = refuelling_value_total
+    result["volume_total"] = refuelling_volume_total
+    result["price_lowest"] = min(
+        [refuelling["preco"] for refuelling in api_data_refuellings]
+    )
+    result["distance"] = (
+        refuellings_odometers[0]["odometro"] - refuellings_odometers[1]["odometro"]
+    )
+    return result
+
+
+def aggregator_metrics(aggregates, columns) -> dict:
+    """Refuelling metrics aggregated over the refuelling columns."""
+    stats = aggregates.RefuellingAggregator.from_columns(columns).result()
+    return {
+        "total": stats.total,
+        "value_total": stats.value_total,
+        "volume_total": stats.volume_total,
+        "price_lowest": stats.price_lowest,
+        "distance": stats.distance,
+    }
+
+
+def allocated(factory) -> tuple[int, object]:
+    """Return the memory held by the result of a factory, and the result."""
+    tracemalloc.start()
+    try:
+        result = factory()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def best_of(repeat: int, func, *args) -> tuple[float, dict]:
+    """Return the best wall time of several runs and the last result."""
+    best = math.inf
+    result = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 30_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    aggregates = load_module("aggregates")
+    analytics = load_module("analytics")
+    efficiency = load_module("efficiency")
+    history = load_module("history")
+
+    print(
+        f"{'records':>8} {'legacy ms':>10} {'next merge ms':>14}"
+        f" {'aggregate ms':>13} {'speedup':>8} {'first merge ms':>15}"
+        f" {'edit merge ms':>14}"
+        f" {'dicts MiB':>10} {'columns MiB':>12} {'segments ms':>12}"
+        f" {'new fill ms':>12} {'prefix ms':>10} {'windows us':>11}"
+    )
+    for size in args.sizes:
+        refuellings = generate_refuellings(size)
+        payload = json.dumps(refuellings)
+        # The API lists the refuellings newest first
+        body = json.dumps(refuellings[::-1]).encode()
+
+        # Memory held by the decoded payload, as the history kept it before,
+        # against the same records merged into the columns.
+        dicts_size, _ = allocated(lambda payload=payload: json.loads(payload))
+        columns_size, _ = allocated(
+            lambda payload=payload: _merged(history, json.loads(payload))
+        )
+
+        # The legacy path sorted the records, the merge puts the columns in
+        # date order.
+        legacy_time, legacy = best_of(
+            args.repeat, legacy_refuelling_metrics, refuellings[::-1]
+        )
+        first_merge_time, sync = best_of(
+            args.repeat, _merged, history, refuellings[::-1], body
+        )
+
+        # One more refuelling, dated after the others
+        *_, last = generate_refuellings(size + 1)
+        next_refuellings = [last, *refuellings[::-1]]
+        next_body = json.dumps(next_refuellings).encode()
+        next_merge_time, _ = best_of(
+            args.repeat, _next_merged, sync, next_refuellings, next_body
+        )
+        edited = [dict(refuellings[0], preco=1.0), *refuellings[1:]][::-1]
+        edit_merge_time, _ = best_of(
+            1, _next_merged, sync, edited, json.dumps(edited).encode()
+        )
+        sync.merge(next_refuellings, next_body)
+
+        new_time, new = best_of(
+            args.repeat, aggregator_metrics, aggregates, sync.columns
+        )
+        _, legacy = best_of(1, legacy_refuelling_metrics, next_refuellings)
+        for key, value in legacy.items():
+            assert math.isclose(value, new[key], rel_tol=1e-9), (key, value, new[key])
+
+        segments_time, engine = best_of(
+            args.repeat, efficiency.EfficiencyEngine.from_columns, sync.columns
+        )
+        since = sync.columns.timestamps[-1]
+        update_time, _ = best_of(1, engine.update, sync.columns, since)
+
+        vehicle = history.VehicleHistory()
+        vehicle.histories[history.HISTORY_REFUELLINGS] = sync
+        prefix_time, index = best_of(
+            args.repeat, analytics.PrefixIndex.from_columns, sync.columns
+        )
+        vehicle.prefix_indexes[history.HISTORY_REFUELLINGS] = index
+        windows_time, _ = best_of(
+            args.repeat, analytics.window_analytics, vehicle, since
+        )
+        print(
+            f"{size:>8} {legacy_time * 1000:>10.1f} {next_merge_time * 1000:>14.1f}"
+            f" {new_time * 1000:>13.1f}"
+            f" {legacy_time / (next_merge_time + new_time):>7.1f}x"
+            f" {first_merge_time * 1000:>15.1f} {edit_merge_time * 1000:>14.1f}"
+            f" {dicts_size / 2**20:>10.1f} {columns_size / 2**20:>12.1f}"
+            f" {segments_time * 1000:>12.1f} {update_time * 1000:>12.3f}"
+            f" {prefix_time * 1000:>10.1f} {windows_time * 1e6:>11.1f}"
+        )
+
+
+def _merged(history, payload: list[dict], body: bytes | None = None):
+    """Merge a payload into an empty refuelling history."""
+    sync = history.HistorySync(history.HISTORY_COLUMNS[history.HISTORY_REFUELLINGS]())
+    sync.merge(payload, body)
+    return sync
+
+
+def _next_merged(sync, payload: list[dict], body: bytes) -> None:
+    """Merge a payload into a copy of a refuelling history."""
+    sync = copy.copy(sync)
+    sync.merge(payload, body)
+
+
+if __name__ == "__main__":
+    main()
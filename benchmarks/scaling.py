@@ -0,0 +1,653 @@
+"""Measure how the Drivvo data path scales with the size of the account.
+
+Every combination of --vehicles and --records runs against a fake Drivvo
+API served by its own process, so generating and serving the histories
+does not weigh on the measurements. Each stage reports:
+
+* wall time, in seconds
+* requests that reached the API, and how many of them were 304s
+* peak memory traced by tracemalloc while the stage ran; tracing slows
+  Python code down a lot, so pass --no-memory for representative times
+* event loop blocking: the total and longest delay of a 10 ms ticker
+
+The stages:
+
+* sync: cold then warm (conditional) refreshes of every history through
+  DrivvoSession and VehicleHistory; needs only aiohttp
+* get_data_vehicle: cold then warm refreshes through get_data_vehicle
+* setup: a new config entry set up, until the setup returns and its
+  sensors exist
+* first_data: a new config entry set up, until every vehicle has data;
+  the first refresh runs in the background once the setup returned
+* restart_setup, restart_first_data: the same, for an entry set up again
+  from the histories it stored
+* unload: the config entry unloaded
+* config_flow: the user and vehicle steps of the config flow
+* round_trip: with --latency, cold then warm refreshes of a single
+  vehicle through get_data_vehicle, also reported in round trips
+
+With --latency, the fake API delays every response by that many seconds,
+like the round trip to the real API. The requests of a vehicle refresh
+are sent together, so it should take about one round trip; the run exits
+with status 1 when a round_trip stage takes more than --max-round-trips.
+
+The fake API lists the histories newest first, as the Drivvo API does;
+--order shuffled or ascending changes that.
+
+All but sync need Home Assistant, and the setup and config_flow stages
+the pytest-homeassistant-custom-component test helpers; they are skipped
+when those are not installed.
+
+Run from the repository root:
+
+    python benchmarks/scaling.py --vehicles 1 10 --records 100 10000 \\
+        --output results.json
+    python benchmarks/scaling.py --compare results.json
+
+Comparing runs exits with status 1 when a metric regressed by more than
+--threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+import contextlib
+import dataclasses
+from datetime import UTC, datetime
+import functools
+import importlib
+import json
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import aiohttp
+
+from common import INTEGRATION_DIR, INTEGRATION_PACKAGE, load_module
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPOSITORY_DIR = INTEGRATION_DIR.parent.parent
+
+EMAIL = "fake@example.com"
+PASSWORD = "secret"
+LAG_TICK = 0.01
+TRACE_MEMORY = True
+
+METRICS = ("wall_time", "requests", "peak_memory", "loop_blocked")
+
+
+@dataclasses.dataclass
+class StageResult:
+    """Measurements of one stage on one account size."""
+
+    stage: str
+    vehicles: int
+    records: int
+    wall_time: float
+    requests: int
+    not_modified: int
+    peak_memory: int
+    loop_blocked: float
+    loop_max_lag: float
+
+    @property
+    def key(self) -> str:
+        """Return what identifies the result across runs."""
+        return f"{self.stage} {self.vehicles}x{self.records}"
+
+
+class LoopLagMonitor:
+    """Measure how long the event loop fails to run a periodic ticker."""
+
+    def __init__(self, tick: float = LAG_TICK) -> None:
+        """Initialize the monitor."""
+        self.tick = tick
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.tick
+            await asyncio.sleep(self.tick)
+            lag = max(loop.time() - expected, 0.0)
+            self.blocked += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    async def __aenter__(self) -> LoopLagMonitor:
+        self._task = asyncio.create_task(self._run())
+        # Let the ticker arm itself before the measured code runs
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+
+class FakeServer:
+    """The fake Drivvo API running as a child process."""
+
+    def __init__(
+        self,
+        vehicles: int,
+        records: int,
+        seed: int,
+        order: str = "descending",
+        latency: float = 0.0,
+    ) -> None:
+        """Initialize the server."""
+        self.latency = latency
+        self.args = [
+            sys.executable,
+            str(BENCHMARKS_DIR / "fake_drivvo.py"),
+            f"--vehicles={vehicles}",
+            f"--records={records}",
+            f"--seed={seed}",
+            f"--order={order}",
+            f"--latency={latency}",
+        ]
+        self.url = ""
+        self._process: subprocess.Popen | None = None
+
+    def __enter__(self) -> FakeServer:
+        self._process = subprocess.Popen(
+            self.args, stdout=subprocess.PIPE, text=True, cwd=BENCHMARKS_DIR
+        )
+        self.url = self._process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError("The fake Drivvo API failed to start")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._process.terminate()
+        self._process.wait()
+
+    async def stats(self, http: aiohttp.ClientSession) -> dict[str, int]:
+        """Return the request counters of the server."""
+        async with http.get(f"{self.url}_stats") as response:
+            return await response.json()
+
+
+async def measure(
+    server: FakeServer,
+    stage: str,
+    vehicles: int,
+    records: int,
+    run: Callable[[], Awaitable[None]],
+) -> StageResult:
+    """Run one stage, measuring it."""
+    async with aiohttp.ClientSession() as http:
+        before = await server.stats(http)
+        peak_memory = 0
+        if TRACE_MEMORY:
+            tracemalloc.start()
+        try:
+            async with LoopLagMonitor() as monitor:
+                start = time.perf_counter()
+                await run()
+                wall_time = time.perf_counter() - start
+            if TRACE_MEMORY:
+                _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        after = await server.stats(http)
+    return StageResult(
+        stage=stage,
+        vehicles=vehicles,
+        records=records,
+        wall_time=wall_time,
+        requests=after["requests"] - before["requests"],
+        not_modified=after["not_modified"] - before["not_modified"],
+        peak_memory=peak_memory,
+        loop_blocked=monitor.blocked,
+        loop_max_lag=monitor.max_lag,
+    )
+
+
+def make_client(api, http: aiohttp.ClientSession, url: str):
+    """Return an API client talking to the fake server."""
+    return api.DrivvoApiClient(http, base_url=url, login_url=f"{url}autenticacao/login")
+
+
+async def bench_sync(server: FakeServer, vehicles: int, records: int) -> list:
+    """Sync every history of every vehicle without Home Assistant."""
+    api = load_module("api")
+    history_module = load_module("history")
+    histories = {
+        vehicle: history_module.VehicleHistory() for vehicle in range(1, vehicles + 1)
+    }
+
+    async with aiohttp.ClientSession() as http:
+        session = api.DrivvoSession(make_client(api, http, server.url), EMAIL, PASSWORD)
+        await session.async_get_token()
+
+        async def sync_vehicle(vehicle: int) -> None:
+            history = histories[vehicle]
+            await session.async_get(f"veiculo/{vehicle}")
+            for kind in history_module.HISTORY_KINDS:
+                sync = history.histories[kind]
+                response = await session.async_get_conditional(
+                    f"veiculo/{vehicle}/{kind}/web",
+                    sync.etag,
+                    sync.last_modified,
+                    sync.checksum,
+                )
+                if response.not_modified:
+                    continue
+                await asyncio.get_running_loop().run_in_executor(
+                    None, history.merge, kind, response.data or [], response.body
+                )
+                sync.etag = response.etag
+                sync.last_modified = response.last_modified
+                sync.checksum = response.checksum
+            history.refuelling_aggregator.result()
+            # Build the timeline, as the entities read it after every refresh.
+            _ = history.timeline.latest
+
+        async def sync_fleet() -> None:
+            await asyncio.gather(*(sync_vehicle(vehicle) for vehicle in histories))
+
+        return [
+            await measure(server, "sync cold", vehicles, records, sync_fleet),
+            await measure(server, "sync warm", vehicles, records, sync_fleet),
+        ]
+
+
+async def bench_get_data_vehicle(
+    server: FakeServer, vehicles: int, records: int
+) -> list:
+    """Refresh every vehicle through get_data_vehicle."""
+    import custom_components.drivvo as integration
+    from custom_components.drivvo import api
+    from custom_components.drivvo.history import VehicleHistory
+
+    histories = {vehicle: VehicleHistory() for vehicle in range(1, vehicles + 1)}
+
+    async with aiohttp.ClientSession() as http:
+        session = api.DrivvoSession(make_client(api, http, server.url), EMAIL, PASSWORD)
+        await session.async_get_token()
+
+        async def refresh_fleet() -> None:
+            await asyncio.gather(
+                *(
+                    integration.get_data_vehicle(
+                        session, vehicle, currency="R$", history=history
+                    )
+                    for vehicle, history in histories.items()
+                )
+            )
+
+        return [
+            await measure(
+                server, "get_data_vehicle cold", vehicles, records, refresh_fleet
+            ),
+            await measure(
+                server, "get_data_vehicle warm", vehicles, records, refresh_fleet
+            ),
+        ]
+
+
+async def bench_round_trips(server: FakeServer, vehicles: int, records: int) -> list:
+    """Refresh a single vehicle through get_data_vehicle, on a slow API."""
+    if not server.latency:
+        return []
+
+    import custom_components.drivvo as integration
+    from custom_components.drivvo import api
+    from custom_components.drivvo.history import VehicleHistory
+
+    history = VehicleHistory()
+
+    async with aiohttp.ClientSession() as http:
+        session = api.DrivvoSession(make_client(api, http, server.url), EMAIL, PASSWORD)
+        await session.async_get_token()
+
+        async def refresh() -> None:
+            await integration.get_data_vehicle(
+                session, 1, currency="R$", history=history
+            )
+
+        return [
+            await measure(server, "round_trip cold", 1, records, refresh),
+            await measure(server, "round_trip warm", 1, records, refresh),
+        ]
+
+
+def round_trips(result: StageResult, latency: float) -> float | None:
+    """Return how many round trips to the API a round_trip stage took."""
+    if not latency or not result.stage.startswith("round_trip"):
+        return None
+    return result.wall_time / latency
+
+
+@contextlib.asynccontextmanager
+async def home_assistant(server: FakeServer):
+    """Yield a test Home Assistant instance whose Drivvo client uses the fake."""
+    from pytest_homeassistant_custom_component.common import (
+        async_test_home_assistant,
+    )
+
+    from homeassistant import loader
+    from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+    import custom_components.drivvo as integration
+    from custom_components.drivvo import api
+
+    original = integration.get_api_client
+    integration.get_api_client = lambda hass: make_client(
+        api, async_get_clientsession(hass), server.url
+    )
+    try:
+        with tempfile.TemporaryDirectory() as storage_dir:
+            async with async_test_home_assistant(storage_dir=storage_dir) as hass:
+                hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+                yield hass
+                await hass.async_stop(force=True)
+    finally:
+        integration.get_api_client = original
+
+
+async def bench_setup(server: FakeServer, vehicles: int, records: int) -> list:
+    """Set up config entries with every vehicle, cold and from their store.
+
+    The first refresh runs in the background once the setup returns, so
+    the setup and first_data stages each start from their own setup; a
+    request answered between two stages would not be counted otherwise.
+    """
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+    from homeassistant.const import EVENT_HOMEASSISTANT_FINAL_WRITE
+
+    from custom_components.drivvo.const import DOMAIN
+
+    async with home_assistant(server) as hass:
+
+        def add_entry() -> MockConfigEntry:
+            entry = MockConfigEntry(
+                domain=DOMAIN,
+                version=2,
+                data={
+                    "email": EMAIL,
+                    "password": PASSWORD,
+                    "vehicles": [str(vehicle) for vehicle in range(1, vehicles + 1)],
+                },
+            )
+            entry.add_to_hass(hass)
+            return entry
+
+        async def setup(entry: MockConfigEntry) -> None:
+            if not await hass.config_entries.async_setup(entry.entry_id):
+                raise RuntimeError("Setting up the config entry failed")
+
+        async def wait_for_data(entry: MockConfigEntry) -> None:
+            while hass._background_tasks:
+                await asyncio.gather(*hass._background_tasks)
+                await hass.async_block_till_done()
+            account = hass.data[DOMAIN][entry.entry_id]
+            missing = [
+                vehicle
+                for vehicle, coordinator in account.vehicle_coordinators.items()
+                if coordinator.data is None
+            ]
+            if missing:
+                raise RuntimeError(f"No data for vehicles {missing}")
+
+        async def setup_until_data(entry: MockConfigEntry) -> None:
+            await setup(entry)
+            await wait_for_data(entry)
+
+        async def unload(entry: MockConfigEntry) -> None:
+            await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_block_till_done()
+            # Flush the stored histories, as stopping Home Assistant would
+            hass.bus.async_fire(EVENT_HOMEASSISTANT_FINAL_WRITE)
+            await hass.async_block_till_done()
+
+        results = []
+        # Cold: removing the entry forgets its store and the vehicle catalogue
+        for stage, run in (("setup", setup), ("first_data", setup_until_data)):
+            entry = add_entry()
+            results.append(
+                await measure(
+                    server, stage, vehicles, records, functools.partial(run, entry)
+                )
+            )
+            await wait_for_data(entry)
+            await hass.config_entries.async_remove(entry.entry_id)
+
+        entry = add_entry()
+        await setup_until_data(entry)
+        await unload(entry)
+        for stage, run in (
+            ("restart_setup", setup),
+            ("restart_first_data", setup_until_data),
+        ):
+            results.append(
+                await measure(
+                    server, stage, vehicles, records, functools.partial(run, entry)
+                )
+            )
+            await wait_for_data(entry)
+            if stage == "restart_setup":
+                await unload(entry)
+        results.append(
+            await measure(
+                server, "unload", vehicles, records, functools.partial(unload, entry)
+            )
+        )
+        return results
+
+
+async def bench_config_flow(server: FakeServer, vehicles: int, records: int) -> list:
+    """Run the config flow up to the vehicle selection."""
+    from custom_components.drivvo.const import DOMAIN
+
+    async with home_assistant(server) as hass:
+
+        async def flow() -> None:
+            result = await hass.config_entries.flow.async_init(
+                DOMAIN, context={"source": "user"}
+            )
+            result = await hass.config_entries.flow.async_configure(
+                result["flow_id"], {"email": EMAIL, "password": PASSWORD}
+            )
+            if result.get("step_id") != "vehicle":
+                raise RuntimeError(f"Unexpected config flow result: {result}")
+            hass.config_entries.flow.async_abort(result["flow_id"])
+
+        return [await measure(server, "config_flow", vehicles, records, flow)]
+
+
+def available_benches() -> list[Callable]:
+    """Return the benches that can run with what is installed."""
+    benches = [bench_sync]
+    sys.path.insert(0, str(REPOSITORY_DIR))
+    try:
+        import homeassistant  # noqa: F401
+    except ImportError:
+        print("Home Assistant is not installed, only running the sync stage")
+        return benches
+    # Import the real package, so load_module returns its modules from now on
+    importlib.import_module(INTEGRATION_PACKAGE)
+    benches.extend((bench_get_data_vehicle, bench_round_trips))
+    # Every test instance warns about the custom integration being loaded
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+    try:
+        import pytest_homeassistant_custom_component  # noqa: F401
+    except ImportError:
+        print("pytest-homeassistant-custom-component is not installed, skipping setup")
+        return benches
+    benches.extend((bench_setup, bench_config_flow))
+    return benches
+
+
+async def run(args: argparse.Namespace) -> list[StageResult]:
+    """Run every bench on every account size."""
+    global TRACE_MEMORY
+    TRACE_MEMORY = args.memory
+    benches = available_benches()
+    if not args.throttle:
+        # Measure the integration, not the request budget of the real API
+        load_module("api").REQUEST_RATE = 1_000_000.0
+
+    results = []
+    for vehicles in args.vehicles:
+        for records in args.records:
+            with FakeServer(
+                vehicles, records, args.seed, args.order, args.latency
+            ) as server:
+                for bench in benches:
+                    for result in await bench(server, vehicles, records):
+                        print_result(result, args.latency)
+                        results.append(result)
+    return results
+
+
+def print_result(result: StageResult, latency: float = 0.0) -> None:
+    """Print one result as a table row."""
+    row = (
+        f"{result.key:>34} {result.wall_time:>9.3f}s {result.requests:>6}"
+        f" ({result.not_modified:>5} 304) {result.peak_memory / 2**20:>9.1f} MiB"
+        f" {result.loop_blocked:>8.3f}s blocked ({result.loop_max_lag:.3f}s max)"
+    )
+    trips = round_trips(result, latency)
+    if trips is not None:
+        row += f" {trips:.2f} round trips"
+    print(row)
+
+
+def check_round_trips(
+    results: list[StageResult], latency: float, max_round_trips: float
+) -> bool:
+    """Return False if a vehicle refresh took too many round trips."""
+    passed = True
+    for result in results:
+        trips = round_trips(result, latency)
+        if trips is not None and trips > max_round_trips:
+            print(
+                f"{result.key} took {trips:.2f} round trips,"
+                f" more than {max_round_trips}"
+            )
+            passed = False
+    return passed
+
+
+def save(results: list[StageResult], path: Path, args: argparse.Namespace) -> None:
+    """Save the results with what is needed to compare them later."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=REPOSITORY_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    data = {
+        "created": datetime.now(UTC).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {
+            "vehicles": args.vehicles,
+            "records": args.records,
+            "seed": args.seed,
+            "throttle": args.throttle,
+            "latency": args.latency,
+            "memory": args.memory,
+        },
+        "results": [dataclasses.asdict(result) for result in results],
+    }
+    path.write_text(json.dumps(data, indent=2))
+    print(f"Saved {len(results)} results to {path}")
+
+
+def compare(results: list[StageResult], baseline_path: Path, threshold: float) -> bool:
+    """Print how the results moved against a baseline, False on regression."""
+    baseline = {
+        StageResult(**result).key: StageResult(**result)
+        for result in json.loads(baseline_path.read_text())["results"]
+    }
+    regressed = False
+    print(f"\nAgainst {baseline_path} (regression above {threshold:.0%}):")
+    for result in results:
+        old = baseline.get(result.key)
+        if old is None:
+            continue
+        changes = []
+        for metric in METRICS:
+            before, after = getattr(old, metric), getattr(result, metric)
+            if metric == "peak_memory" and not (before and after):
+                # One of the runs did not trace memory
+                continue
+            ratio = after / before if before else (1.0 if not after else float("inf"))
+            flag = ""
+            # Tiny blocking times are noise rather than regressions
+            if ratio > 1 + threshold and not (
+                metric == "loop_blocked" and after < LAG_TICK
+            ):
+                flag = "!"
+                regressed = True
+            changes.append(f"{metric} {ratio:>6.2f}x{flag}")
+        print(f"{result.key:>34}  " + "  ".join(changes))
+    return not regressed
+
+
+def main() -> None:
+    """Run the benchmarks and save or compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--order",
+        choices=("descending", "shuffled", "ascending"),
+        default="descending",
+        help="date order the fake API lists the histories in",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds the fake API waits before every response",
+    )
+    parser.add_argument("--max-round-trips", type=float, default=1.5)
+    parser.add_argument(
+        "--throttle",
+        action="store_true",
+        help="keep the request rate limit of the real API",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="skip tracemalloc, which slows the stages down",
+    )
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output is not None:
+        save(results, args.output, args)
+    passed = check_round_trips(results, args.latency, args.max_round_trips)
+    if args.compare is not None and not compare(results, args.compare, args.threshold):
+        passed = False
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark sensor state reads before and after precomputing the values.
+
+Home Assistant reads native_value every time it writes or renders a state.
+The old entity parsed the timestamp sensors on each read; the new one
+reads a value computed once per snapshot.
+
+Run from the repository root:
+
+    python benchmarks/state_reads.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+from datetime import UTC, datetime
+import timeit
+
+from common import load_module
+
+
+@dataclasses.dataclass
+class LegacySnapshot:
+    """Fields of the old snapshot read by the timestamp sensors."""
+
+    odometer_date: str
+    refuelling_total: int
+
+
+class LegacyEntity:
+    """The old native_value code path."""
+
+    def __init__(self, value_fn, timestamp: bool, data: LegacySnapshot) -> None:
+        """Initialize the entity."""
+        self.value_fn = value_fn
+        self.timestamp = timestamp
+        self.data = data
+
+    @property
+    def native_value(self):
+        """Return the value, parsing timestamps on every read."""
+        try:
+            value = self.value_fn(self.data)
+            if self.timestamp and isinstance(value, str):
+                try:
+                    dt_obj = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+                    # The old code attached pytz.UTC here
+                    return dt_obj.replace(tzinfo=UTC)
+                except ValueError:
+                    return None
+            return value
+        except (KeyError, AttributeError):
+            return None
+
+
+class PrecomputedEntity:
+    """The new code path: the value is read from an attribute."""
+
+    def __init__(self, value) -> None:
+        """Initialize the entity."""
+        self._attr_native_value = value
+
+    @property
+    def native_value(self):
+        """Return the precomputed value."""
+        return self._attr_native_value
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=200_000)
+    args = parser.parse_args()
+
+    columns = load_module("columns")
+    timestamp = columns.parse_timestamp("2024-05-17 08:31:00")
+    legacy_data = LegacySnapshot("2024-05-17 08:31:00", 42)
+
+    cases = {
+        "timestamp": (
+            LegacyEntity(lambda data: data.odometer_date, True, legacy_data),
+            PrecomputedEntity(columns.timestamp_to_datetime(timestamp)),
+        ),
+        "number": (
+            LegacyEntity(lambda data: data.refuelling_total, False, legacy_data),
+            PrecomputedEntity(42),
+        ),
+    }
+
+    print(f"{'sensor':>10} {'legacy ns':>10} {'precomputed ns':>15} {'speedup':>8}")
+    for name, (legacy, precomputed) in cases.items():
+        assert legacy.native_value == precomputed.native_value
+        legacy_time = min(
+            timeit.repeat(
+                lambda legacy=legacy: legacy.native_value, number=args.reads, repeat=5
+            )
+        )
+        new_time = min(
+            timeit.repeat(
+                lambda precomputed=precomputed: precomputed.native_value,
+                number=args.reads,
+                repeat=5,
+            )
+        )
+        print(
+            f"{name:>10} {legacy_time / args.reads * 1e9:>10.0f}"
+            f" {new_time / args.reads * 1e9:>15.0f}"
+            f" {legacy_time / new_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Exercise the Drivvo transport layer against a faulty fake API.
+
+Each scenario refreshes a small fleet through one DrivvoSession while the
+fake API injects errors, and reports how many requests reached the API and
+how many refreshes succeeded. Backoff delays are scaled down so the run
+takes seconds.
+
+Run from the repository root (needs aiohttp):
+
+    python benchmarks/transport_faults.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import timedelta
+import time
+
+import aiohttp
+
+from common import load_module
+from fake_drivvo import FakeDrivvo, Faults, generate_fleet
+
+SCENARIOS = {
+    "healthy": Faults(),
+    "flaky 503": Faults(error_rate=0.3),
+    "429 + Retry-After": Faults(error_rate=0.3, error_status=429, retry_after=0.05),
+    "outage": Faults(error_rate=1.0, error_status=500),
+    "long Retry-After": Faults(error_rate=1.0, error_status=429, retry_after=3600),
+}
+
+
+async def run_scenario(api, fake: FakeDrivvo, rounds: int) -> tuple[int, int, float]:
+    """Refresh every vehicle several times, returning successes and failures."""
+    succeeded = failed = 0
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        client = api.DrivvoApiClient(
+            http, base_url=fake.url, login_url=f"{fake.url}autenticacao/login"
+        )
+        session = api.DrivvoSession(client, "fake@example.com", "secret")
+        for _ in range(rounds):
+            for vehicle in fake.fleet:
+                try:
+                    await session.async_get(f"veiculo/{vehicle}")
+                    for kind in ("abastecimento", "servico", "despesa"):
+                        await session.async_get(f"veiculo/{vehicle}/{kind}/web")
+                except (aiohttp.ClientError, api.DrivvoApiError):
+                    failed += 1
+                else:
+                    succeeded += 1
+    return succeeded, failed, time.perf_counter() - start
+
+
+async def main() -> None:
+    """Run every scenario."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=0.01)
+    args = parser.parse_args()
+
+    api = load_module("api")
+    transport = load_module("transport")
+    transport.RETRY_BACKOFF_BASE = timedelta(seconds=args.backoff)
+    api.REQUEST_RATE = 1000.0
+
+    fleet = generate_fleet(args.vehicles, 50)
+    print(
+        f"{'scenario':>18} {'requests':>9} {'errors':>7}"
+        f" {'refreshes ok':>13} {'failed':>7} {'seconds':>8}"
+    )
+    for name, faults in SCENARIOS.items():
+        fake = FakeDrivvo(fleet, faults)
+        await fake.start()
+        try:
+            succeeded, failed, elapsed = await run_scenario(api, fake, args.rounds)
+        finally:
+            await fake.stop()
+        print(
+            f"{name:>18} {fake.requests:>9} {fake.errors:>7}"
+            f" {succeeded:>13} {failed:>7} {elapsed:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
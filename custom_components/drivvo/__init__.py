@@ -1,71 +1,74 @@
+import asyncio
 import dataclasses
-import hashlib
+from datetime import datetime
 import logging
+import time
+from typing import Any
 
-import requests
+import aiohttp
 
 from homeassistant import config_entries, core
 from homeassistant.const import Platform
-from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
+from .analytics import window_analytics
+from .api import (
+    DrivvoApiClient,
+    DrivvoApiError,
+    DrivvoSession,
+)
+from .catalogue import async_get_catalogue, vehicle_identification
+from .columns import timestamp_to_datetime
 from .const import (
-    BASE_URL,
     CONF_EMAIL,
     CONF_ID_VEHICLE,
     CONF_PASSWORD,
     CONF_VEHICLES,
+    DATA_SESSIONS,
     DOMAIN,
-    LOGIN_BASE_URL,
 )
+from .coordinator import DrivvoAccount
+from .efficiency import convert_efficiency
+from .history import (
+    HISTORY_EXPENSES,
+    HISTORY_KINDS,
+    HISTORY_SERVICES,
+    VehicleHistory,
+    record_fingerprint,
+)
+from .instrumentation import STAGE_AGGREGATE, STAGE_MERGE
+from .payload import log_payload
+from .scheduler import async_get_scheduler
+from .store import async_remove_store
 
 PLATFORMS = [Platform.SENSOR]
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def get_default_headers() -> dict:
-    """Get default headers for Drivvo API requests."""
-    return {
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
-        "App-Platform": "HA-Drivvo",
-        "App-Version": "1",
-        "Cache-Control": "no-cache",
-        "Content-Type": "application/json",
-        "Dnt": "1",
-        "Origin": "https://web.drivvo.com",
-        "Pragma": "no-cache",
-        "Priority": "u=1, i",
-        "Referer": "https://web.drivvo.com/",
-        "Sec-Ch-Ua": '"Chromium";v="140", "Not-A?Brand";v="24", "Microsoft Edge";v="140"',
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": '"macOS"',
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "same-site",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0",
-    }
-
-
 async def async_setup_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ):
-    if await auth(
-        hass=hass,
-        user=entry.data.get(CONF_EMAIL),
-        password=entry.data.get(CONF_PASSWORD),
-    ):
-        hass.data.setdefault(DOMAIN, {})
-        hass.data[DOMAIN][entry.entry_id] = entry.data
+    session = async_get_session(
+        hass, entry.data.get(CONF_EMAIL), entry.data.get(CONF_PASSWORD)
+    )
+    account = DrivvoAccount(hass, entry, session)
+    await account.async_load(DrivvoDataVehicle.from_dict)
+    entry.async_on_unload(
+        account.coordinator.async_add_listener(account.async_handle_account_update)
+    )
 
-        # Initialize coordinators storage
-        hass.data.setdefault(f"{DOMAIN}_coordinators", {})
+    hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN][entry.entry_id] = account
 
-        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # The entities exist from here on; logging in and fetching the data
+    # does not hold up the start of Home Assistant
+    entry.async_create_background_task(
+        hass, account.async_first_refresh(), f"Drivvo first refresh {session.email}"
+    )
 
-    else:
-        raise ConfigEntryAuthFailed("Invalid authentication")
     return True
 
 
@@ -76,15 +79,25 @@ async def async_unload_entry(
 
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
-    # Clean up coordinators when integration is unloaded
+    # Drop the account data, and with it the vehicle coordinators
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
-        if entry.entry_id in hass.data.get(f"{DOMAIN}_coordinators", {}):
-            hass.data[f"{DOMAIN}_coordinators"].pop(entry.entry_id)
+        account: DrivvoAccount = hass.data[DOMAIN].pop(entry.entry_id)
+        await account.async_shutdown()
+        async_get_catalogue(hass).invalidate(entry.data[CONF_EMAIL])
+        async_release_session(hass, entry.data[CONF_EMAIL])
 
     return unload_ok
 
 
+async def async_remove_entry(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> None:
+    """Remove the cached data and credentials of a deleted config entry."""
+    async_get_catalogue(hass).invalidate(entry.data[CONF_EMAIL])
+    async_release_session(hass, entry.data[CONF_EMAIL])
+    await async_remove_store(hass, entry.entry_id)
+
+
 async def async_migrate_entry(
     hass: core.HomeAssistant, config_entry: config_entries.ConfigEntry
 ):
@@ -108,385 +121,286 @@ async def async_migrate_entry(
     return True
 
 
-async def auth(
-    hass,
-    user,
-    password,
-    token: bool | None = False,
-) -> bool:
-    password = hashlib.md5(password.encode("utf-8")).hexdigest()
-
-    def login():
-        headers = get_default_headers()
-        return requests.post(
-            LOGIN_BASE_URL,
-            json={
-                "email": user,
-                "senha": password,
-            },
-            headers=headers,
-        )
-
-    response = await hass.async_add_executor_job(login)
+def get_api_client(hass: core.HomeAssistant) -> DrivvoApiClient:
+    """Return a Drivvo API client on Home Assistant's shared session."""
+    return DrivvoApiClient(async_get_clientsession(hass))
 
-    if response.ok:
-        if token:
-            return response.json().get("token")
-        return True
 
-    return False
-
-
-async def get_vehicles(
-    hass,
-    token: bool | None = False,
-) -> bool:
-    def get():
-        headers = get_default_headers()
-        headers["x-token"] = token
-        return requests.get(
-            "https://api.drivvo.com/veiculo/web",
-            headers=headers,
+@core.callback
+def async_get_session(
+    hass: core.HomeAssistant, email: str, password: str
+) -> DrivvoSession:
+    """Return the login session of a Drivvo account, creating it if needed."""
+    sessions: dict[str, DrivvoSession] = hass.data.setdefault(DATA_SESSIONS, {})
+    session = sessions.get(email.lower())
+    if session is None:
+        session = DrivvoSession(
+            get_api_client(hass), email, password, async_get_scheduler(hass)
         )
+        sessions[email.lower()] = session
+    else:
+        session.set_password(password)
+    return session
 
-    response = await hass.async_add_executor_job(get)
-    _LOGGER.debug("API Response Vehicles: %s", response.json())
-
-    if response.ok:
-        return response.json()
-    return None
-
-
-async def get_data_vehicle(hass, user, password, id_vehicle):
-    """Get The request from the api."""
-
-    def get():
-        headers = get_default_headers()
-        headers["x-token"] = token
-        return requests.get(url, headers=headers)
-
-    def sort_by_key(list):
-        return list["data"]
 
-    token = await auth(
-        hass=hass,
-        user=user,
-        password=password,
-        token=True,
-    )
-    if token:
-        url = f"{BASE_URL}/veiculo/{id_vehicle}"
-        response_vehicle = await hass.async_add_executor_job(get)
-        if response_vehicle.ok:
-            api_data_vehicle = response_vehicle.json()
-        else:
-            return None
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - Vehicle: %s", id_vehicle, api_data_vehicle
-        )
+@core.callback
+def async_release_session(hass: core.HomeAssistant, email: str) -> None:
+    """Forget the session of an account once no loaded entry uses it.
 
-        url = f"{BASE_URL}/veiculo/{id_vehicle}/abastecimento/web"
-        response_refuelling = await hass.async_add_executor_job(get)
-        if response_refuelling.ok:
-            api_data_refuellings = sorted(
-                response_refuelling.json(), key=sort_by_key, reverse=True
-            )
-        else:
-            api_data_refuellings = None
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - Refuelling: %s",
-            id_vehicle,
-            api_data_refuellings,
+    The session holds the password hash and token of the account, which
+    are not kept in memory past the entries using them.
+    """
+    accounts: dict[str, DrivvoAccount] = hass.data.get(DOMAIN, {})
+    if any(
+        account.session.email.lower() == email.lower() for account in accounts.values()
+    ):
+        return
+    hass.data.get(DATA_SESSIONS, {}).pop(email.lower(), None)
+
+
+async def async_check_credentials(
+    hass: core.HomeAssistant, email: str, password: str
+) -> None:
+    """Log in to check credentials, raising DrivvoAuthError if rejected.
+
+    The login is sent like any other request of the account, through its
+    rate limit, circuit breaker and the shared scheduler. The session of
+    the account is only used when the password is the one it holds, so a
+    mistyped password cannot break the refreshes of a loaded entry.
+    """
+    session = hass.data.get(DATA_SESSIONS, {}).get(email.lower())
+    if session is None or not session.has_password(password):
+        session = DrivvoSession(
+            get_api_client(hass), email, password, async_get_scheduler(hass)
         )
+    await session.async_get_token()
 
-        url = f"{BASE_URL}/veiculo/{id_vehicle}/servico/web"
-        response_services = await hass.async_add_executor_job(get)
-        if response_services.ok:
-            api_data_services = sorted(
-                response_services.json(), key=sort_by_key, reverse=True
-            )
-        else:
-            api_data_services = None
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - Services: %s", id_vehicle, api_data_services
-        )
 
-        url = f"{BASE_URL}/veiculo/{id_vehicle}/despesa/web"
-        response_expenses = await hass.async_add_executor_job(get)
-        if response_expenses.ok:
-            api_data_expenses = sorted(
-                response_expenses.json(), key=sort_by_key, reverse=True
-            )
-        else:
-            api_data_expenses = None
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - Expenses: %s", id_vehicle, api_data_expenses
+async def _async_sync_history(
+    session: DrivvoSession, history: VehicleHistory, id_vehicle, kind: str
+) -> bool:
+    """Bring one history of a vehicle up to date, returning True if it changed.
+
+    The histories are fetched together, so a failing endpoint is logged and
+    its last known records are kept instead of failing the whole refresh.
+    Merging reads every record of the payload, so it runs in the executor.
+    """
+    sync = history.histories[kind]
+    path = f"veiculo/{id_vehicle}/{kind}/web"
+    try:
+        response = await session.async_get_conditional(
+            path, sync.etag, sync.last_modified, sync.checksum
         )
+    except (aiohttp.ClientError, DrivvoApiError, TimeoutError, ValueError) as err:
+        _LOGGER.warning("Failed to fetch Drivvo endpoint %s: %s", path, err)
+        return False
 
-        name: str | None = None
-        placa: str | None = None
-        if api_data_vehicle["nome"] is not None and api_data_vehicle["nome"] != "":
-            name = api_data_vehicle["nome"]
-        if api_data_vehicle["placa"] is not None and api_data_vehicle["placa"] != "":
-            placa = api_data_vehicle["placa"]
-
-        if name is not None:
-            identification = name
-        elif placa:
-            identification = placa
-        else:
-            identification = f"{api_data_vehicle['marca']}/{api_data_vehicle['modelo']}"
-
-        refuelling_date = None
-        refuelling_odometer = None
-        refuelling_last_average = None
-        refuelling_general_average = None
-        refuelling_station = None
-        refuelling_type = None
-        refuelling_value = None
-        refuelling_distance = None
-        refuelling_reason = None
-        refuelling_price = None
-        refuelling_total = 0
-        refuelling_value_total = None
-        refuelling_tank_full = None
-        refuelling_price_lowest = None
-        refuelling_volume = None
-        refuelling_volume_total = None
-        currency = None
-
-        refuellings_odometers = []
-        if len(api_data_refuellings) > 0:
-            refuelling_total = len(api_data_refuellings)
-
-            refuelling_value_total = 0
-            refuelling_volume_total = 0
-            for refuelling in api_data_refuellings:
-                refuelling_value_total += refuelling["valor_total"]
-
-                if refuelling["volume"] != 0:
-                    refuelling_volume_total += refuelling["volume"]
-                else:
-                    refuelling_volume_total += (
-                        refuelling["valor_total"] / refuelling["preco"]
-                    )
-
-            refuelling_distance = 0
-            refuellings_odometers = [
-                {
-                    "odometro": refuelling["odometro"],
-                    "data": refuelling["data"],
-                    "volume": refuelling["volume"],
-                    "tanque_cheio": refuelling["tanque_cheio"],
-                    "preco": refuelling["preco"],
-                    "valor_total": refuelling["valor_total"],
-                }
-                for refuelling in api_data_refuellings
-            ]
-            _LOGGER.debug(
-                "API Response Data Vehicle %s - odometers: %s",
-                id_vehicle,
-                refuellings_odometers,
-            )
-
-            if len(refuellings_odometers) > 1:
-                refuelling_distance = (
-                    refuellings_odometers[0]["odometro"]
-                    - refuellings_odometers[1]["odometro"]
-                )
-                if refuelling_volume_total > 0:
-                    refuelling_general_average = (
-                        refuellings_odometers[0]["odometro"]
-                        - refuellings_odometers[len(refuellings_odometers) - 1][
-                            "odometro"
-                        ]
-                    ) / (refuelling_volume_total)
-                else:
-                    refuelling_general_average = 0
-
-                volume = 0
-                odometer_init = None
-                odometer_old = None
-                for odometer in refuellings_odometers:
-                    if odometer["tanque_cheio"] and odometer_init is None:
-                        odometer_init = odometer["odometro"]
-
-                    if odometer_init is not None:
-                        if (odometer["tanque_cheio"]) and (
-                            odometer["odometro"] != odometer_init
-                        ):
-                            odometer_old = odometer["odometro"]
-                            break
-
-                        if odometer["volume"] != 0:
-                            volume += odometer["volume"]
-                        else:
-                            volume += odometer["valor_total"] / odometer["preco"]
-
-                if volume > 0 and odometer_old is not None:
-                    refuelling_last_average = (
-                        refuellings_odometers[0]["odometro"] - odometer_old
-                    ) / (volume)
-                else:
-                    refuelling_last_average = 0
-
-            refuelling_price_lowest = min(
-                [refuelling["preco"] for refuelling in api_data_refuellings]
-            )
-
-            refuelling = api_data_refuellings[0]
-            refuelling_date = refuelling["data"]
-            refuelling_type = refuelling["combustivel"]
-            refuelling_value = refuelling["valor_total"]
-            refuelling_price = refuelling["preco"]
-            refuelling_odometer = refuelling["odometro"]
-            if refuelling["volume"] != 0:
-                refuelling_volume = refuelling["volume"]
-            else:
-                refuelling_volume = refuelling["valor_total"] / refuelling["preco"]
-            refuelling_reason = refuelling["tipo_motivo"]
-            refuelling_tank_full = refuelling["tanque_cheio"]
-
-            station = refuelling["posto_combustivel"]
-            if (station is not None) and ("nome" in station):
-                refuelling_station = station["nome"]
-
-        distance_unit: str | None = None
-        if api_data_vehicle["unidade_distancia"] == 1:
-            distance_unit = "km"
-        elif api_data_vehicle["unidade_distancia"] == 2:
-            distance_unit = "mi"
-
-        services_odometers = []
-        if len(api_data_services) > 0:
-            services_odometers = [
-                {
-                    "odometro": service["odometro"],
-                    "data": service["data"],
-                }
-                for service in api_data_services
-            ]
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - odometers services: %s",
-            id_vehicle,
-            services_odometers,
-        )
+    if response.not_modified or not response.ok:
+        return False
 
-        expenses_odometers = []
-        if len(api_data_expenses) > 0:
-            expenses_odometers = [
-                {
-                    "odometro": expense["odometro"],
-                    "data": expense["data"],
-                }
-                for expense in api_data_expenses
-            ]
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - odometers expenses: %s",
-            id_vehicle,
-            expenses_odometers,
+    with session.metrics.time_stage(STAGE_MERGE):
+        delta = await asyncio.get_running_loop().run_in_executor(
+            None, history.merge, kind, response.data or [], response.body
         )
+    session.metrics.record_records(kind, len(sync))
+    sync.etag = response.etag
+    sync.last_modified = response.last_modified
+    sync.checksum = response.checksum
+    _LOGGER.debug(
+        "API Response Data Vehicle %s - %s: %s added, %s changed, %s removed",
+        id_vehicle,
+        kind,
+        len(delta.added),
+        len(delta.changed),
+        len(delta.removed),
+    )
+    return bool(delta)
 
-        odometers = refuellings_odometers
-        odometers.extend(services_odometers)
-        odometers.extend(expenses_odometers)
-
-        odometers = sorted(odometers, key=sort_by_key, reverse=True)
 
-        _LOGGER.debug(
-            "API Response Data Vehicle %s - odometers: %s",
-            id_vehicle,
-            odometers,
-        )
+async def get_data_vehicle(
+    session: DrivvoSession,
+    id_vehicle,
+    currency: str | None = None,
+    history: VehicleHistory | None = None,
+):
+    """Get The request from the api.
+
+    When the history of a previous refresh is given, only new or changed
+    records are merged and the previous result is returned untouched if
+    nothing changed since it was built.
+    """
+
+    if history is None:
+        history = VehicleHistory()
+
+    # Every sync runs to its end even if the vehicle cannot be fetched, so
+    # none is left merging behind a refresh that already failed
+    results = await asyncio.gather(
+        session.async_get(f"veiculo/{id_vehicle}"),
+        *(
+            _async_sync_history(session, history, id_vehicle, kind)
+            for kind in HISTORY_KINDS
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    api_data_vehicle = results[0]
+
+    if api_data_vehicle is None:
+        return None
+    log_payload(
+        _LOGGER,
+        "API Response Data Vehicle %s - Vehicle: %s",
+        id_vehicle,
+        api_data_vehicle,
+    )
 
-        odometer_last = None
-        odometer_date_last = None
-        if len(odometers) > 0:
-            odometer_last = odometers[0]["odometro"]
-            odometer_date_last = odometers[0]["data"]
-
-        url = f"{BASE_URL}/configuracao"
-        response_config = await hass.async_add_executor_job(get)
-        if response_config.ok:
-            try:
-                api_data_config = response_config.json()
-                if isinstance(api_data_config, list) and len(api_data_config) > 0:
-                    api_data_config = api_data_config[0]
-                    if isinstance(api_data_config, dict):
-                        currency = api_data_config.get("formato_valor", None)
-                    else:
-                        _LOGGER.warning(
-                            "API config data is not a dictionary: %s", api_data_config
-                        )
-                        currency = None
-                else:
-                    _LOGGER.warning(
-                        "API config data is not a list or is empty: %s", api_data_config
-                    )
-                    currency = None
-            except Exception as e:
-                _LOGGER.error("Failed to parse API config data: %s", e)
-                api_data_config = None
-                currency = None
-        else:
-            api_data_config = None
-            currency = None
-
-        _LOGGER.debug(
-            "API Response config: %s (currency=%s)",
-            api_data_config,
-            currency,
-        )
+    vehicle_fingerprint = record_fingerprint(api_data_vehicle)
+    if (
+        history.snapshot is not None
+        and history.snapshot.history_version == history.version
+        and vehicle_fingerprint == history.vehicle_fingerprint
+        and currency == history.currency
+    ):
+        # The windows slide even when no record changed
+        analytics = window_analytics(history, time.time())
+        if analytics != history.snapshot.analytics:
+            history.snapshot = dataclasses.replace(
+                history.snapshot, analytics=analytics
+            )
+        _LOGGER.debug("Data of vehicle %s is unchanged", id_vehicle)
+        return history.snapshot
 
-        data_return = DrivvoDataVehicle(
-            id=id_vehicle,
-            name=name,
-            identification=identification,
-            placa=placa,
-            odometer=odometer_last,
-            distance_unit=distance_unit,
-            odometer_date=odometer_date_last,
-            manufacturer=api_data_vehicle["marca"],
-            model=api_data_vehicle["modelo"],
-            refuelling_date=refuelling_date,
-            refuelling_odometer=refuelling_odometer,
-            refuelling_last_average=refuelling_last_average,
-            refuelling_general_average=refuelling_general_average,
-            refuelling_station=refuelling_station,
-            refuelling_type=refuelling_type,
-            refuelling_value=refuelling_value,
-            refuelling_distance=refuelling_distance,
-            refuelling_reason=refuelling_reason,
-            refuelling_price=refuelling_price,
-            refuelling_total=refuelling_total,
-            refuelling_value_total=refuelling_value_total,
-            refuelling_tank_full=refuelling_tank_full,
-            refuelling_price_lowest=refuelling_price_lowest,
-            refuelling_volume=refuelling_volume,
-            refuelling_volume_total=refuelling_volume_total,
-            currency=currency,
+    with session.metrics.time_stage(STAGE_AGGREGATE):
+        data_return = _build_vehicle_data(
+            api_data_vehicle, id_vehicle, currency, history, history.version
         )
-
-        _LOGGER.debug("API Response Data Vehicle - Refuelling: %s", data_return)
-        return data_return
+    _LOGGER.debug("API Response Data Vehicle - Refuelling: %s", data_return)
+
+    history.vehicle_fingerprint = vehicle_fingerprint
+    history.currency = currency
+    history.snapshot = data_return
+    return data_return
+
+
+def _build_vehicle_data(
+    api_data_vehicle: dict,
+    id_vehicle,
+    currency: str | None,
+    history: VehicleHistory,
+    history_version: int,
+) -> "DrivvoDataVehicle":
+    """Build the snapshot of a vehicle from its record and histories."""
+    name: str | None = None
+    placa: str | None = None
+    if api_data_vehicle["nome"] is not None and api_data_vehicle["nome"] != "":
+        name = api_data_vehicle["nome"]
+    if api_data_vehicle["placa"] is not None and api_data_vehicle["placa"] != "":
+        placa = api_data_vehicle["placa"]
+
+    identification = vehicle_identification(api_data_vehicle)
+
+    refuellings = history.refuelling_aggregator.result()
+
+    distance_unit: str | None = None
+    if api_data_vehicle["unidade_distancia"] == 1:
+        distance_unit = "km"
+    elif api_data_vehicle["unidade_distancia"] == 2:
+        distance_unit = "mi"
+
+    efficiency = history.efficiency.result()
+    services = history.cost_aggregators[HISTORY_SERVICES].result()
+    expenses = history.cost_aggregators[HISTORY_EXPENSES].result()
+
+    odometer_last = None
+    odometer_date_last = None
+    latest_event = history.timeline.latest
+    if latest_event is not None:
+        odometer_last = latest_event[1]
+        odometer_date_last = timestamp_to_datetime(latest_event[0])
+
+    return DrivvoDataVehicle(
+        id=id_vehicle,
+        name=name,
+        identification=identification,
+        placa=placa,
+        odometer=odometer_last,
+        distance_unit=distance_unit,
+        odometer_date=odometer_date_last,
+        manufacturer=api_data_vehicle["marca"],
+        model=api_data_vehicle["modelo"],
+        refuelling_date=refuellings.date,
+        refuelling_odometer=refuellings.odometer,
+        refuelling_last_average=convert_efficiency(efficiency.last, distance_unit),
+        refuelling_general_average=convert_efficiency(
+            efficiency.overall, distance_unit
+        ),
+        refuelling_efficiency_best=convert_efficiency(efficiency.best, distance_unit),
+        refuelling_efficiency_worst=convert_efficiency(efficiency.worst, distance_unit),
+        refuelling_efficiency_median=convert_efficiency(
+            efficiency.median, distance_unit
+        ),
+        refuelling_efficiency_rolling=convert_efficiency(
+            efficiency.rolling, distance_unit
+        ),
+        refuelling_station=refuellings.station,
+        refuelling_type=refuellings.type,
+        refuelling_value=refuellings.value,
+        refuelling_distance=refuellings.distance,
+        refuelling_reason=refuellings.reason,
+        refuelling_price=refuellings.price,
+        refuelling_total=refuellings.total,
+        refuelling_value_total=refuellings.value_total,
+        refuelling_tank_full=refuellings.tank_full,
+        refuelling_price_lowest=refuellings.price_lowest,
+        refuelling_volume=refuellings.volume,
+        refuelling_volume_total=refuellings.volume_total,
+        service_total=services.total,
+        service_value_total=services.value_total,
+        service_date=services.date,
+        service_value=services.value,
+        service_type=services.type,
+        service_category_counts=services.category_counts,
+        service_category_values=services.category_values,
+        expense_total=expenses.total,
+        expense_value_total=expenses.value_total,
+        expense_date=expenses.date,
+        expense_value=expenses.value,
+        expense_type=expenses.type,
+        expense_category_counts=expenses.category_counts,
+        expense_category_values=expenses.category_values,
+        currency=currency,
+        analytics=window_analytics(history, time.time()),
+        history_version=history_version,
+    )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class DrivvoDataVehicle:
-    """Data parsed from the API."""
+    """Data parsed from the API.
+
+    Snapshots are immutable, so a refresh can be compared field by field
+    with the previous one.
+    """
 
     id: int
     name: str | None
     identification: str | None
     placa: str | None
     odometer: int | None
-    odometer_date: str | None
+    odometer_date: datetime | None
     manufacturer: str
     model: str
-    refuelling_date: str | None
+    refuelling_date: datetime | None
     refuelling_odometer: int | None
     refuelling_last_average: float | None
     refuelling_general_average: float | None
+    refuelling_efficiency_best: float | None
+    refuelling_efficiency_worst: float | None
+    refuelling_efficiency_median: float | None
+    refuelling_efficiency_rolling: float | None
     refuelling_station: str | None
     refuelling_type: str | None
     refuelling_value: float | None
@@ -500,4 +414,41 @@ class DrivvoDataVehicle:
     refuelling_price_lowest: float | None
     distance_unit: str
     refuelling_volume_total: float | None
+    service_total: int
+    service_value_total: float | None
+    service_date: datetime | None
+    service_value: float | None
+    service_type: str | None
+    service_category_counts: dict[str, int]
+    service_category_values: dict[str, float]
+    expense_total: int
+    expense_value_total: float | None
+    expense_date: datetime | None
+    expense_value: float | None
+    expense_type: str | None
+    expense_category_counts: dict[str, int]
+    expense_category_values: dict[str, float]
     currency: str | None
+    analytics: dict[str, float | int | None]
+    # Version of the history the snapshot was built from
+    history_version: int = dataclasses.field(default=0, compare=False)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the snapshot in a JSON serializable form."""
+        data = dataclasses.asdict(self)
+        for field in _DATETIME_FIELDS:
+            if data[field] is not None:
+                data[field] = data[field].isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "DrivvoDataVehicle":
+        """Restore a snapshot saved with as_dict."""
+        data = dict(data)
+        for field in _DATETIME_FIELDS:
+            if data[field] is not None:
+                data[field] = datetime.fromisoformat(data[field])
+        return cls(**data)
+
+
+_DATETIME_FIELDS = ("odometer_date", "refuelling_date", "service_date", "expense_date")
@@ -0,0 +1,205 @@
+"""Streaming aggregates over the Drivvo histories."""
+
+from __future__ import annotations
+
+import dataclasses
+from datetime import datetime
+from typing import Any
+
+from .columns import (
+    HistoryColumns,
+    RefuellingColumns,
+    column_min,
+    column_sum,
+    odometer_value,
+    timestamp_to_datetime,
+)
+
+
+@dataclasses.dataclass
+class RefuellingStats:
+    """Refuelling metrics of a vehicle."""
+
+    total: int = 0
+    value_total: float | None = None
+    volume_total: float | None = None
+    price_lowest: float | None = None
+    distance: int | None = None
+    date: datetime | None = None
+    odometer: int | None = None
+    station: str | None = None
+    type: str | None = None
+    value: float | None = None
+    reason: str | None = None
+    price: float | None = None
+    tank_full: bool | None = None
+    volume: float | None = None
+
+
+class RefuellingAggregator:
+    """Compute every refuelling metric from the refuelling columns.
+
+    An aggregator is built over whole columns at once, and new rows
+    appended at the end of the history can then be streamed in without
+    rescanning it. Each metric keeps a constant amount of state.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty aggregator."""
+        self.count = 0
+        self.newest_timestamp: int | None = None
+        self._value_total = 0.0
+        self._volume_total = 0.0
+        self._price_lowest: float | None = None
+        self._previous_odometer: int | None = None
+        self._latest: RefuellingStats | None = None
+
+    @classmethod
+    def from_columns(cls, columns: RefuellingColumns) -> RefuellingAggregator:
+        """Aggregate a whole refuelling history."""
+        aggregator = cls()
+        rows = len(columns)
+        if rows == 0:
+            return aggregator
+
+        aggregator.count = rows
+        aggregator._value_total = column_sum(columns.totals)
+        aggregator._volume_total = column_sum(columns.volumes)
+        aggregator._price_lowest = column_min(columns.prices)
+        if rows > 1:
+            aggregator._previous_odometer = odometer_value(columns.odometers[-2])
+        aggregator._set_latest(columns, rows - 1)
+        return aggregator
+
+    def feed_row(self, columns: RefuellingColumns, row: int) -> None:
+        """Account for the next refuelling in date order."""
+        self.count += 1
+        self._value_total += columns.totals[row]
+        self._volume_total += columns.volumes[row]
+        price = columns.prices[row]
+        if self._price_lowest is None or price < self._price_lowest:
+            self._price_lowest = price
+
+        if self._latest is not None:
+            self._previous_odometer = self._latest.odometer
+        self._set_latest(columns, row)
+
+    def _set_latest(self, columns: RefuellingColumns, row: int) -> None:
+        """Remember the fields of the most recent refuelling."""
+        self.newest_timestamp = columns.timestamps[row]
+        self._latest = RefuellingStats(
+            date=timestamp_to_datetime(self.newest_timestamp),
+            odometer=odometer_value(columns.odometers[row]),
+            station=columns.categories["station"][row],
+            type=columns.categories["fuel"][row],
+            value=columns.totals[row],
+            reason=columns.categories["reason"][row],
+            price=columns.prices[row],
+            tank_full=bool(columns.tank_full[row]),
+            volume=columns.volumes[row],
+        )
+
+    def result(self) -> RefuellingStats:
+        """Return the metrics of the refuellings aggregated so far."""
+        latest = self._latest
+        if latest is None:
+            return RefuellingStats()
+
+        stats = dataclasses.replace(
+            latest,
+            total=self.count,
+            value_total=self._value_total,
+            volume_total=self._volume_total,
+            price_lowest=self._price_lowest,
+            distance=0,
+        )
+
+        if self._previous_odometer is not None and latest.odometer is not None:
+            stats.distance = latest.odometer - self._previous_odometer
+
+        return stats
+
+
+@dataclasses.dataclass
+class CostStats:
+    """Service or expense metrics of a vehicle."""
+
+    total: int = 0
+    value_total: float | None = None
+    date: datetime | None = None
+    odometer: int | None = None
+    value: float | None = None
+    type: str | None = None
+    category_counts: dict[str, int] = dataclasses.field(default_factory=dict)
+    category_values: dict[str, float] = dataclasses.field(default_factory=dict)
+
+
+class CostAggregator:
+    """Compute the service or expense metrics from their columns.
+
+    Counts and amounts do not depend on the order of the rows, so new
+    records are fed wherever their date puts them in the history; only
+    changed or removed records need the columns aggregated again. Records
+    without a type are counted in the totals but in no category.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty aggregator."""
+        self.count = 0
+        self.newest_timestamp: int | None = None
+        self._value_total = 0.0
+        self._category_counts: dict[str, int] = {}
+        self._category_values: dict[str, float] = {}
+        self._latest: CostStats | None = None
+
+    @classmethod
+    def from_columns(cls, columns: HistoryColumns) -> CostAggregator:
+        """Aggregate a whole service or expense history."""
+        aggregator = cls()
+        category = columns.categories["category"]
+        for row in range(len(columns)):
+            aggregator.feed(
+                {
+                    "timestamps": columns.timestamps[row],
+                    "odometers": columns.odometers[row],
+                    "totals": columns.totals[row],
+                },
+                {"category": category[row]},
+            )
+        return aggregator
+
+    def feed(self, numeric: dict[str, Any], categories: dict[str, str | None]) -> None:
+        """Account for a record, as read by the extract of its columns."""
+        self.count += 1
+        value = numeric["totals"]
+        self._value_total += value
+        category = categories["category"]
+        if category is not None:
+            self._category_counts[category] = self._category_counts.get(category, 0) + 1
+            self._category_values[category] = (
+                self._category_values.get(category, 0.0) + value
+            )
+
+        # Records of the same date are inserted after the known ones
+        timestamp = numeric["timestamps"]
+        if self.newest_timestamp is None or timestamp >= self.newest_timestamp:
+            self.newest_timestamp = timestamp
+            self._latest = CostStats(
+                date=timestamp_to_datetime(timestamp),
+                odometer=odometer_value(numeric["odometers"]),
+                value=value,
+                type=category,
+            )
+
+    def result(self) -> CostStats:
+        """Return the metrics of the records aggregated so far."""
+        if self._latest is None:
+            return CostStats()
+
+        return dataclasses.replace(
+            self._latest,
+            total=self.count,
+            value_total=self._value_total,
+            category_counts=dict(self._category_counts),
+            category_values=dict(self._category_values),
+        )
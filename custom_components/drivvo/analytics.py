@@ -0,0 +1,108 @@
+"""Spending and distance of a vehicle over rolling windows of time."""
+
+from __future__ import annotations
+
+from array import array
+import bisect
+from datetime import timedelta
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from .columns import HistoryColumns
+from .const import ANALYTICS_WINDOWS
+
+if TYPE_CHECKING:
+    from .history import VehicleHistory
+
+
+class PrefixIndex:
+    """Running totals of one history, in the date order of its rows.
+
+    sums[row] is the amount paid in the rows before row, and odometers[row]
+    the highest odometer read in them, so the amount paid between two
+    dates takes two bisections of the timestamps and a subtraction. Rows
+    added to a history only recompute the running totals from their row on.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the index of an empty history."""
+        self.sums = array("d", [0.0])
+        self.odometers = array("q", [0])
+
+    @classmethod
+    def from_columns(cls, columns: HistoryColumns) -> PrefixIndex:
+        """Index a whole history."""
+        index = cls()
+        index.update(columns, 0)
+        return index
+
+    def update(self, columns: HistoryColumns, row: int) -> None:
+        """Recompute the running totals from a row on."""
+        del self.sums[row + 1 :]
+        del self.odometers[row + 1 :]
+        total = self.sums[row]
+        highest = self.odometers[row]
+        for value, odometer in zip(
+            islice(columns.totals, row, None),
+            islice(columns.odometers, row, None),
+            strict=True,
+        ):
+            total += value
+            highest = max(highest, odometer)
+            self.sums.append(total)
+            self.odometers.append(highest)
+
+
+def _window_rows(columns: HistoryColumns, start: int, end: int) -> tuple[int, int]:
+    """Return the bounds of the rows dated from start to end, inclusive."""
+    return (
+        bisect.bisect_left(columns.timestamps, start),
+        bisect.bisect_right(columns.timestamps, end),
+    )
+
+
+def window_key(window: timedelta) -> str:
+    """Return the suffix of the analytics of a window, like 30d."""
+    return f"{window.days}d"
+
+
+def window_analytics(
+    history: VehicleHistory, now: float
+) -> dict[str, float | int | None]:
+    """Return the spending and distance of every window ending now.
+
+    The distance runs from the highest odometer read before the window,
+    or the first one read in it, to the highest one read by its end.
+    Odometers left at zero are ignored.
+    """
+    analytics: dict[str, float | int | None] = {}
+    end = int(now)
+    for window in ANALYTICS_WINDOWS:
+        start = end - int(window.total_seconds())
+        spent = 0.0
+        reached = 0
+        before = 0
+        first_read: int | None = None
+        for kind, index in history.prefix_indexes.items():
+            low, high = _window_rows(history.histories[kind].columns, start, end)
+            spent += index.sums[high] - index.sums[low]
+            reached = max(reached, index.odometers[high])
+            before = max(before, index.odometers[low])
+            # The running maximum turns positive at the first reading
+            row = bisect.bisect_right(index.odometers, 0, low + 1, high + 1)
+            if row <= high and (
+                first_read is None or index.odometers[row] < first_read
+            ):
+                first_read = index.odometers[row]
+
+        distance: int | None = None
+        if before:
+            distance = reached - before
+        elif first_read is not None:
+            distance = reached - first_read
+
+        key = window_key(window)
+        analytics[f"spend_{key}"] = spent
+        analytics[f"distance_{key}"] = distance
+        analytics[f"cost_per_distance_{key}"] = spent / distance if distance else None
+    return analytics
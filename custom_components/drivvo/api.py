@@ -0,0 +1,446 @@
+"""Asynchronous client for the Drivvo API."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import contextlib
+import dataclasses
+import hashlib
+from http import HTTPStatus
+import json
+import logging
+import time
+import zlib
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import aiohttp
+
+from .const import (
+    BASE_URL,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    LOGIN_BASE_URL,
+    REQUEST_BURST,
+    REQUEST_RATE,
+    REQUEST_RETRIES,
+    REQUEST_TIMEOUT,
+    RETRY_BACKOFF_MAX,
+    TOKEN_EXPIRY_MARGIN,
+    TOKEN_LIFETIME,
+)
+from .instrumentation import STAGE_LOGIN, STAGE_QUEUE, DrivvoMetrics
+from .payload import async_decode_json
+from .transport import CircuitBreaker, TokenBucket, backoff_delay, parse_retry_after
+
+if TYPE_CHECKING:
+    from .scheduler import RequestScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class DrivvoAuthError(Exception):
+    """Raised when Drivvo rejects the credentials or the session token."""
+
+
+class DrivvoApiError(Exception):
+    """Raised when the Drivvo API fails to answer a request."""
+
+
+class DrivvoRetryableError(DrivvoApiError):
+    """Raised on a rate limited or server error response."""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        """Initialize the error with the delay asked for by the API."""
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DrivvoUnavailableError(DrivvoApiError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+def _raise_for_retryable(path: str, response: aiohttp.ClientResponse) -> None:
+    """Raise DrivvoRetryableError on a 429 or 5xx response."""
+    if (
+        response.status == HTTPStatus.TOO_MANY_REQUESTS
+        or response.status >= HTTPStatus.INTERNAL_SERVER_ERROR
+    ):
+        raise DrivvoRetryableError(
+            f"{path} answered with status {response.status}",
+            parse_retry_after(response.headers),
+        )
+
+
+def hash_password(password: str) -> str:
+    """Hash a password the way the Drivvo login endpoint expects it."""
+    return hashlib.md5(password.encode("utf-8")).hexdigest()
+
+
+def get_default_headers() -> dict:
+    """Get default headers for Drivvo API requests.
+
+    Accept-Encoding is left to aiohttp, which only advertises the
+    encodings it is able to decode.
+    """
+    return {
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+        "App-Platform": "HA-Drivvo",
+        "App-Version": "1",
+        "Cache-Control": "no-cache",
+        "Content-Type": "application/json",
+        "Dnt": "1",
+        "Origin": "https://web.drivvo.com",
+        "Pragma": "no-cache",
+        "Priority": "u=1, i",
+        "Referer": "https://web.drivvo.com/",
+        "Sec-Ch-Ua": '"Chromium";v="140", "Not-A?Brand";v="24", "Microsoft Edge";v="140"',
+        "Sec-Ch-Ua-Mobile": "?0",
+        "Sec-Ch-Ua-Platform": '"macOS"',
+        "Sec-Fetch-Dest": "empty",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Site": "same-site",
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0",
+    }
+
+
+@dataclasses.dataclass
+class DrivvoResponse:
+    """Outcome of a GET request."""
+
+    data: Any | None = None
+    ok: bool = True
+    not_modified: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    size: int = 0
+    decode_time: float = 0.0
+    checksum: int | None = None
+    # Raw body the data was decoded from
+    body: bytes | None = None
+
+
+class DrivvoApiClient:
+    """Drivvo API client running on a shared aiohttp session.
+
+    The session is owned by the caller (normally Home Assistant's shared
+    client session), so connections are pooled and kept alive between
+    requests instead of being re-established for every call.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        base_url: str = BASE_URL,
+        login_url: str = LOGIN_BASE_URL,
+    ) -> None:
+        """Initialize the client."""
+        self._session = session
+        self._base_url = base_url.rstrip("/")
+        self._login_url = login_url
+        self._timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT.total_seconds())
+
+    def url(self, path: str) -> str:
+        """Return the absolute URL for an API path."""
+        return f"{self._base_url}/{path.lstrip('/')}"
+
+    async def async_login(self, email: str, password_hash: str) -> dict | None:
+        """Log in with an already hashed password.
+
+        Returns the login payload (which holds the token) or None if the
+        credentials were rejected.
+        """
+        async with self._session.post(
+            self._login_url,
+            json={
+                "email": email,
+                "senha": password_hash,
+            },
+            headers=get_default_headers(),
+            timeout=self._timeout,
+        ) as response:
+            _raise_for_retryable("login", response)
+            if not response.ok:
+                _LOGGER.debug("Login rejected with status %s", response.status)
+                return None
+            data, _ = await async_decode_json(await response.read())
+            return data
+
+    async def async_get(self, path: str, token: str) -> Any | None:
+        """Perform an authenticated GET and return the decoded body.
+
+        Returns None when the API answers with an error status and raises
+        DrivvoAuthError when the token is no longer accepted.
+        """
+        return (await self.async_get_conditional(path, token)).data
+
+    async def async_get_conditional(
+        self,
+        path: str,
+        token: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        checksum: int | None = None,
+    ) -> DrivvoResponse:
+        """Perform an authenticated GET, revalidating a previous response.
+
+        The validators of the previous response are sent along, so the
+        API can answer 304 instead of resending an unchanged body. A body
+        resent with the CRC32 of the previous one is not decoded, and is
+        reported as not modified too.
+        """
+        headers = get_default_headers()
+        headers["x-token"] = token
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+
+        async with self._session.get(
+            self.url(path), headers=headers, timeout=self._timeout
+        ) as response:
+            if response.status == HTTPStatus.UNAUTHORIZED:
+                raise DrivvoAuthError(f"Token rejected for {path}")
+            _raise_for_retryable(path, response)
+            if response.status == HTTPStatus.NOT_MODIFIED:
+                return DrivvoResponse(
+                    not_modified=True, etag=etag, last_modified=last_modified
+                )
+            if not response.ok:
+                _LOGGER.debug("GET %s failed with status %s", path, response.status)
+                return DrivvoResponse(ok=False)
+            body = await response.read()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        body_checksum = zlib.crc32(body)
+        if body_checksum == checksum:
+            return DrivvoResponse(
+                not_modified=True,
+                etag=etag,
+                last_modified=last_modified,
+                checksum=checksum,
+            )
+        data, decode_time = await async_decode_json(body)
+        _LOGGER.debug(
+            "Decoded %s (%s bytes) in %.1f ms", path, len(body), decode_time * 1000
+        )
+        return DrivvoResponse(
+            data=data,
+            etag=etag,
+            last_modified=last_modified,
+            size=len(body),
+            decode_time=decode_time,
+            checksum=body_checksum,
+            body=body,
+        )
+
+
+def _token_expiry(token: str) -> float | None:
+    """Return the expiry (epoch seconds) of a JWT token, if it carries one."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class DrivvoSession:
+    """Login session shared by everything that talks to one Drivvo account.
+
+    The password is hashed once and the token is reused until it expires
+    or the API rejects it. Concurrent callers needing a new token wait on
+    the same login request.
+
+    Every request of the account goes through a token bucket and a circuit
+    breaker, and GETs failing transiently are retried with backoff. With a
+    scheduler, requests also wait for a slot shared with the other accounts.
+    """
+
+    def __init__(
+        self,
+        client: DrivvoApiClient,
+        email: str,
+        password: str,
+        scheduler: RequestScheduler | None = None,
+    ) -> None:
+        """Initialize the session."""
+        self.client = client
+        self.email = email
+        self.scheduler = scheduler
+        self._password_hash = hash_password(password)
+        self._token: str | None = None
+        self._token_expires_at: float = 0
+        self._login_task: asyncio.Task[str] | None = None
+        self.timeouts = 0
+        self.metrics = DrivvoMetrics()
+        self._bucket = TokenBucket(REQUEST_RATE, REQUEST_BURST)
+        self._breaker = CircuitBreaker(
+            CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT.total_seconds()
+        )
+
+    def has_password(self, password: str) -> bool:
+        """Return True if the session logs in with this password."""
+        return hash_password(password) == self._password_hash
+
+    def set_password(self, password: str) -> None:
+        """Update the password, dropping the token if it changed."""
+        password_hash = hash_password(password)
+        if password_hash != self._password_hash:
+            self._password_hash = password_hash
+            self.invalidate_token()
+
+    def invalidate_token(self, token: str | None = None) -> None:
+        """Forget the cached token.
+
+        When a token is given, it is only forgotten if it is still the
+        current one, so a stale 401 does not discard a fresh login.
+        """
+        if token is None or token == self._token:
+            self._token = None
+            self._token_expires_at = 0
+
+    async def async_get_token(self) -> str:
+        """Return a valid token, logging in only when needed."""
+        if self._token is not None and time.time() < self._token_expires_at:
+            return self._token
+
+        if self._login_task is None:
+            self._login_task = asyncio.create_task(self._async_login())
+            self._login_task.add_done_callback(self._login_done)
+        return await asyncio.shield(self._login_task)
+
+    def _login_done(self, task: asyncio.Task[str]) -> None:
+        """Allow the next login once the in-flight one finished."""
+        self._login_task = None
+        if not task.cancelled():
+            # Retrieve the exception so it is not reported as unhandled
+            # when every waiter was cancelled.
+            task.exception()
+
+    async def _async_login(self) -> str:
+        """Log in and cache the token."""
+        with self.metrics.time_stage(STAGE_LOGIN):
+            response = await self._async_send(
+                "login",
+                lambda: self.client.async_login(self.email, self._password_hash),
+                retries=0,
+            )
+        if response is None or not response.get("token"):
+            raise DrivvoAuthError("Invalid authentication")
+
+        token = response["token"]
+        expires_at = _token_expiry(token)
+        if expires_at is None:
+            expires_at = time.time() + TOKEN_LIFETIME.total_seconds()
+        self._token = token
+        self._token_expires_at = expires_at - TOKEN_EXPIRY_MARGIN.total_seconds()
+        _LOGGER.debug("Logged in to Drivvo as %s", self.email)
+        return token
+
+    async def _async_send(
+        self,
+        path: str,
+        request: Callable[[], Awaitable[_T]],
+        retries: int = REQUEST_RETRIES,
+    ) -> _T:
+        """Send a request, retrying transient failures with backoff.
+
+        A Retry-After longer than the backoff cap is not waited for; the
+        circuit is opened for that long instead. Every attempt is accounted
+        in the metrics under the path.
+        """
+        for attempt in range(retries + 1):
+            if self._breaker.is_open:
+                raise DrivvoUnavailableError(
+                    f"Drivvo API unavailable for {self._breaker.retry_in:.0f}s"
+                )
+            await self._bucket.async_acquire()
+            try:
+                async with self._async_slot():
+                    start = time.perf_counter()
+                    result = await request()
+            except DrivvoAuthError:
+                self.metrics.record_failure(path, retrying=False)
+                raise
+            except DrivvoRetryableError as err:
+                error: Exception = err
+                delay = err.retry_after
+            except (aiohttp.ClientError, TimeoutError) as err:
+                if isinstance(err, TimeoutError):
+                    self.timeouts += 1
+                error = err
+                delay = None
+            else:
+                self._breaker.record_success()
+                if isinstance(result, DrivvoResponse):
+                    self.metrics.record_request(
+                        path,
+                        time.perf_counter() - start,
+                        result.size,
+                        result.decode_time,
+                        result.not_modified,
+                    )
+                else:
+                    self.metrics.record_request(path, time.perf_counter() - start)
+                return result
+
+            if delay is None:
+                delay = backoff_delay(attempt)
+            retrying = attempt < retries and delay <= RETRY_BACKOFF_MAX.total_seconds()
+            self.metrics.record_failure(path, retrying)
+            if not retrying:
+                break
+            _LOGGER.debug("Retrying in %.1fs after: %s", delay, error)
+            await asyncio.sleep(delay)
+
+        self._breaker.record_failure()
+        if isinstance(error, DrivvoRetryableError) and error.retry_after is not None:
+            self._breaker.open(error.retry_after)
+        raise error
+
+    @contextlib.asynccontextmanager
+    async def _async_slot(self) -> AsyncIterator[None]:
+        """Hold a request slot of the shared scheduler, if there is one."""
+        if self.scheduler is None:
+            yield
+            return
+        async with self.scheduler.async_slot(self.email.lower()) as waited:
+            self.metrics.record_stage(STAGE_QUEUE, waited)
+            yield
+
+    async def _async_with_token(
+        self, path: str, request: Callable[[str], Awaitable[_T]]
+    ) -> _T:
+        """Run a request with the token, logging in again once on a 401."""
+        token = await self.async_get_token()
+        try:
+            return await self._async_send(path, lambda: request(token))
+        except DrivvoAuthError:
+            self.invalidate_token(token)
+        token = await self.async_get_token()
+        return await self._async_send(path, lambda: request(token))
+
+    async def async_get(self, path: str) -> Any | None:
+        """Perform an authenticated GET."""
+        return (await self.async_get_conditional(path)).data
+
+    async def async_get_conditional(
+        self,
+        path: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        checksum: int | None = None,
+    ) -> DrivvoResponse:
+        """Perform an authenticated conditional GET."""
+        return await self._async_with_token(
+            path,
+            lambda token: self.client.async_get_conditional(
+                path, token, etag, last_modified, checksum
+            ),
+        )
@@ -0,0 +1,242 @@
+"""Backfill of the Drivvo histories into long-term statistics."""
+
+from __future__ import annotations
+
+from array import array
+import bisect
+from collections.abc import Callable
+import dataclasses
+from datetime import UTC, datetime
+from itertools import islice
+import logging
+import math
+from typing import Any
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfVolume
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, STATISTICS_BATCH_SIZE
+from .history import VehicleHistory
+
+_LOGGER = logging.getLogger(__name__)
+
+_HOUR = 3600
+
+
+@dataclasses.dataclass(frozen=True)
+class _Series:
+    """Dated values of one statistic, copied from the columns."""
+
+    timestamps: array
+    values: array
+    # Odometers are readings, every other series adds amounts up
+    reading: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class BackfillStatistic:
+    """A long-term statistic fed from the histories of a vehicle."""
+
+    key: str
+    name: str
+    unit_fn: Callable[[Any], str | None]
+    series_fn: Callable[[VehicleHistory], _Series]
+
+
+BACKFILL_STATISTICS: tuple[BackfillStatistic, ...] = (
+    BackfillStatistic(
+        key="refuelling_cost",
+        name="Refuelling cost",
+        unit_fn=lambda data: data.currency,
+        series_fn=lambda history: _Series(
+            array("q", history.refuellings.columns.timestamps),
+            array("d", history.refuellings.columns.totals),
+        ),
+    ),
+    BackfillStatistic(
+        key="refuelling_volume",
+        name="Refuelling volume",
+        unit_fn=lambda data: UnitOfVolume.LITERS,
+        series_fn=lambda history: _Series(
+            array("q", history.refuellings.columns.timestamps),
+            array("d", history.refuellings.columns.volumes),
+        ),
+    ),
+    BackfillStatistic(
+        key="service_cost",
+        name="Service cost",
+        unit_fn=lambda data: data.currency,
+        series_fn=lambda history: _Series(
+            array("q", history.services.columns.timestamps),
+            array("d", history.services.columns.totals),
+        ),
+    ),
+    BackfillStatistic(
+        key="expense_cost",
+        name="Expense cost",
+        unit_fn=lambda data: data.currency,
+        series_fn=lambda history: _Series(
+            array("q", history.expenses.columns.timestamps),
+            array("d", history.expenses.columns.totals),
+        ),
+    ),
+    BackfillStatistic(
+        key="odometer",
+        name="Odometer",
+        unit_fn=lambda data: data.distance_unit,
+        series_fn=lambda history: _Series(
+            array("q", history.timeline.timestamps),
+            array("d", history.timeline.odometers),
+            reading=True,
+        ),
+    ),
+)
+
+
+def statistic_id(vehicle: str, key: str) -> str:
+    """Return the id of a statistic of a vehicle."""
+    return f"{DOMAIN}:vehicle_{vehicle}_{key}".lower()
+
+
+def hourly_buckets(series: _Series, start: int = 0) -> list[list]:
+    """Group the rows from start on by hour, as [hour, value] pairs.
+
+    Amounts are summed over the hour and readings keep their maximum;
+    readings of zero or below mean the odometer was not filled in and are
+    skipped.
+    """
+    buckets: list[list] = []
+    for timestamp, value in zip(
+        islice(series.timestamps, start, None),
+        islice(series.values, start, None),
+        strict=True,
+    ):
+        if series.reading and value <= 0:
+            continue
+        hour = timestamp - timestamp % _HOUR
+        if buckets and buckets[-1][0] == hour:
+            if series.reading:
+                buckets[-1][1] = max(buckets[-1][1], value)
+            else:
+                buckets[-1][1] += value
+        else:
+            buckets.append([hour, value])
+    return buckets
+
+
+def plan_backfill(
+    series: _Series, last: dict[str, float] | None
+) -> tuple[bool, list[StatisticData]]:
+    """Return whether to clear the statistic, and the rows to import.
+
+    Only the hours from the last imported one on are imported again, as
+    long as the rows before it still add up to what was imported; an
+    edited or deleted past record makes the whole statistic rebuilt.
+    """
+    first_reading = next((value for value in series.values if value), 0.0)
+    clear = False
+    start = 0
+    if last is not None:
+        start = bisect.bisect_left(series.timestamps, int(last["start"]))
+        if series.reading:
+            consistent = math.isclose(
+                last["state"] - first_reading, last["sum"], abs_tol=1e-6
+            )
+        else:
+            consistent = math.isclose(
+                math.fsum(islice(series.values, start)),
+                last["sum"] - last["state"],
+                abs_tol=1e-6,
+            )
+        if not consistent:
+            clear = True
+            start = 0
+
+    total = 0.0
+    if start and not series.reading:
+        total = last["sum"] - last["state"]
+
+    rows: list[StatisticData] = []
+    for hour, value in hourly_buckets(series, start):
+        start_time = datetime.fromtimestamp(hour, UTC)
+        if series.reading:
+            rows.append(
+                StatisticData(
+                    start=start_time, state=value, max=value, sum=value - first_reading
+                )
+            )
+        else:
+            total += value
+            rows.append(StatisticData(start=start_time, state=value, sum=total))
+    return clear, rows
+
+
+async def async_backfill_vehicle(
+    hass: HomeAssistant,
+    vehicle: str,
+    history: VehicleHistory,
+    data: Any,
+    last_rows: dict[str, dict[str, float]],
+) -> None:
+    """Bring the long-term statistics of a vehicle up to date.
+
+    last_rows keeps the last row imported into each statistic. Imports are
+    queued in the recorder, so reading them back right away could miss
+    them; the database is only read when nothing was imported yet.
+    """
+    recorder = get_instance(hass)
+    for statistic in BACKFILL_STATISTICS:
+        unit = statistic.unit_fn(data)
+        if unit is None:
+            continue
+        # Copy the columns, so a merge cannot change them while the
+        # executor reads them
+        series = statistic.series_fn(history)
+        if not series.timestamps:
+            continue
+        metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=f"{data.identification} {statistic.name}",
+            source=DOMAIN,
+            statistic_id=statistic_id(vehicle, statistic.key),
+            unit_of_measurement=unit,
+        )
+
+        last = last_rows.get(metadata["statistic_id"])
+        if last is None:
+            last_stats = await recorder.async_add_executor_job(
+                get_last_statistics,
+                hass,
+                1,
+                metadata["statistic_id"],
+                True,
+                {"state", "sum"},
+            )
+            if last_stats.get(metadata["statistic_id"]):
+                last = last_stats[metadata["statistic_id"]][0]
+        clear, rows = await hass.async_add_executor_job(plan_backfill, series, last)
+
+        if clear:
+            _LOGGER.debug("Rebuilding statistic %s", metadata["statistic_id"])
+            recorder.async_clear_statistics([metadata["statistic_id"]])
+        for batch in range(0, len(rows), STATISTICS_BATCH_SIZE):
+            async_add_external_statistics(
+                hass, metadata, rows[batch : batch + STATISTICS_BATCH_SIZE]
+            )
+        if rows:
+            row = rows[-1]
+            last_rows[metadata["statistic_id"]] = {
+                "start": row["start"].timestamp(),
+                "state": row["state"],
+                "sum": row["sum"],
+            }
+        _LOGGER.debug(
+            "Imported %s hours into statistic %s", len(rows), metadata["statistic_id"]
+        )
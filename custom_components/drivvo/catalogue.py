@@ -0,0 +1,97 @@
+"""Vehicles of each Drivvo account, shared by the flows and the accounts."""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+
+from .api import DrivvoSession
+from .const import CATALOGUE_TTL, DATA_CATALOGUE
+from .payload import log_payload
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class _CatalogueEntry:
+    """Vehicles of an account and when they were fetched."""
+
+    vehicles: list[dict]
+    fetched_at: float
+
+
+class VehicleCatalogue:
+    """Vehicle lists of the accounts, kept for CATALOGUE_TTL.
+
+    The account coordinators refresh it on every update, so the flows
+    read it without calling the API while an entry is loaded.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty catalogue."""
+        self._entries: dict[str, _CatalogueEntry] = {}
+
+    def get(self, email: str) -> list[dict] | None:
+        """Return the vehicles of an account, if known and fresh."""
+        entry = self._entries.get(email.lower())
+        if entry is None:
+            return None
+        if time.monotonic() - entry.fetched_at > CATALOGUE_TTL.total_seconds():
+            del self._entries[email.lower()]
+            return None
+        return entry.vehicles
+
+    def set(self, email: str, vehicles: list[dict]) -> None:
+        """Store the vehicles of an account."""
+        self._entries[email.lower()] = _CatalogueEntry(vehicles, time.monotonic())
+
+    def invalidate(self, email: str) -> None:
+        """Forget the vehicles of an account."""
+        self._entries.pop(email.lower(), None)
+
+    async def async_get_vehicles(self, session: DrivvoSession) -> list[dict] | None:
+        """Return the vehicles of an account, fetching them if needed."""
+        vehicles = self.get(session.email)
+        if vehicles is not None:
+            return vehicles
+
+        vehicles = await session.async_get("veiculo/web")
+        log_payload(_LOGGER, "API Response Vehicles: %s", vehicles)
+        if vehicles is not None:
+            self.set(session.email, vehicles)
+        return vehicles
+
+
+@callback
+def async_get_catalogue(hass: HomeAssistant) -> VehicleCatalogue:
+    """Return the vehicle catalogue shared by every entry."""
+    return hass.data.setdefault(DATA_CATALOGUE, VehicleCatalogue())
+
+
+def vehicle_identification(vehicle: dict) -> str:
+    """Return how a vehicle is named: its name, its plate or its make/model."""
+    if vehicle["nome"]:
+        return vehicle["nome"]
+    if vehicle["placa"]:
+        return vehicle["placa"]
+    return f"{vehicle['marca']}/{vehicle['modelo']}"
+
+
+def vehicle_labels(vehicles: list[dict]) -> dict[str, str]:
+    """Return the labels of the active vehicles, by vehicle id."""
+    labels = {}
+    for vehicle in vehicles:
+        if vehicle["ativo"]:
+            vehicle_name = ""
+            if vehicle["nome"] is not None and vehicle["nome"] != "":
+                vehicle_name += f"{vehicle['nome']} - "
+            if vehicle["placa"] is not None and vehicle["placa"] != "":
+                vehicle_name += f"{vehicle['placa']} - "
+            vehicle_name += (
+                f"{vehicle['marca']}/{vehicle['modelo']} ({vehicle['id_veiculo']})"
+            )
+            labels[str(vehicle["id_veiculo"])] = vehicle_name
+    return labels
@@ -0,0 +1,370 @@
+"""Compact, array backed columns holding the Drivvo histories."""
+
+from __future__ import annotations
+
+from array import array
+import bisect
+from collections.abc import Collection, Hashable, Iterable, Sequence
+from datetime import UTC, datetime, timedelta
+from typing import Any, ClassVar
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is an optional fast path
+    np = None
+
+# Below this many values the NumPy call overhead outweighs the gain
+_NUMPY_MIN_SIZE = 2048
+
+# Odometer column value of a record without an odometer
+MISSING_ODOMETER = -1
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def parse_timestamp(value: str) -> int:
+    """Convert a Drivvo date string, in UTC, to epoch seconds."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.replace(tzinfo=None)
+    # Three times faster than going through an aware datetime
+    return (moment - _EPOCH) // _SECOND
+
+
+def timestamp_to_datetime(timestamp: int) -> datetime:
+    """Convert epoch seconds to an aware datetime."""
+    return datetime.fromtimestamp(timestamp, UTC)
+
+
+def odometer_value(odometer: int) -> int | None:
+    """Return an odometer read from a column, or None if it was missing."""
+    return None if odometer == MISSING_ODOMETER else odometer
+
+
+def refuelling_volume(refuelling: dict) -> float:
+    """Return the volume of a refuelling, deriving it from the price if unset."""
+    if refuelling["volume"] != 0:
+        return refuelling["volume"]
+    return refuelling["valor_total"] / refuelling["preco"]
+
+
+def column_sum(column: array, start: int = 0, stop: int | None = None) -> float:
+    """Sum a numeric column, or a slice of it."""
+    if stop is None:
+        stop = len(column)
+    if np is not None and stop - start >= _NUMPY_MIN_SIZE:
+        return float(np.frombuffer(column, dtype=column.typecode)[start:stop].sum())
+    return sum(column[start:stop])
+
+
+def column_min(column: array) -> float | None:
+    """Return the smallest value of a numeric column."""
+    if not column:
+        return None
+    if np is not None and len(column) >= _NUMPY_MIN_SIZE:
+        return np.frombuffer(column, dtype=column.typecode).min().item()
+    return min(column)
+
+
+def name_of(value: Any) -> str | None:
+    """Return the display name of a category field.
+
+    Drivvo returns categories either as plain strings, as objects with a
+    name or as lists of those.
+    """
+    if isinstance(value, str):
+        return value or None
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return name_of(value.get("nome"))
+    if isinstance(value, list):
+        names = [name for name in map(name_of, value) if name is not None]
+        return ", ".join(names) or None
+    return str(value)
+
+
+def _odometer(value: Any) -> int:
+    """Return the odometer of a record for its column."""
+    if value is None or value == "":
+        return MISSING_ODOMETER
+    return int(value)
+
+
+class CategoryColumn:
+    """Column of repeated strings, stored once and referenced by code."""
+
+    def __init__(self) -> None:
+        """Initialize an empty column."""
+        self.values: list[str | None] = []
+        self.codes = array("I")
+        self._index: dict[str | None, int] = {}
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> str | None:
+        """Return the value of a row."""
+        return self.values[self.codes[row]]
+
+    def code(self, value: str | None) -> int:
+        """Return the code of a value, interning it if needed."""
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def take(self, rows: Sequence[int]) -> CategoryColumn:
+        """Return a new column holding the given rows, with the same codes."""
+        column = CategoryColumn()
+        column.values = list(self.values)
+        column._index = dict(self._index)
+        column.codes = array("I", [self.codes[row] for row in rows])
+        return column
+
+    def as_dict(self) -> dict:
+        """Return the column in a JSON serializable form."""
+        return {"values": self.values, "codes": self.codes.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CategoryColumn:
+        """Restore a column saved with as_dict."""
+        column = cls()
+        for value in data["values"]:
+            column.code(value)
+        column.codes = array("I", data["codes"])
+        return column
+
+
+class HistoryColumns:
+    """Typed columns of one history, with rows kept in date order.
+
+    Subclasses declare their numeric columns (name to array typecode) and
+    category columns, how to read them from an API record and which fields
+    of the record that reads.
+    """
+
+    NUMERIC: ClassVar[dict[str, str]] = {
+        "timestamps": "q",
+        "odometers": "q",
+        "totals": "d",
+    }
+    CATEGORIES: ClassVar[tuple[str, ...]] = ("category",)
+    FIELDS: ClassVar[tuple[str, ...]] = ("data", "odometro", "valor_total")
+
+    def __init__(self) -> None:
+        """Initialize empty columns."""
+        self.keys: list[Hashable] = []
+        self.fingerprints = array("L")
+        self.numeric: dict[str, array] = {
+            name: array(typecode) for name, typecode in self.NUMERIC.items()
+        }
+        self.categories: dict[str, CategoryColumn] = {
+            name: CategoryColumn() for name in self.CATEGORIES
+        }
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.keys)
+
+    @property
+    def timestamps(self) -> array:
+        """Return the epoch timestamp of every row."""
+        return self.numeric["timestamps"]
+
+    @property
+    def odometers(self) -> array:
+        """Return the odometer of every row, MISSING_ODOMETER if unset."""
+        return self.numeric["odometers"]
+
+    @property
+    def totals(self) -> array:
+        """Return the amount paid in every row."""
+        return self.numeric["totals"]
+
+    def extract(self, record: dict) -> tuple[dict[str, Any], dict[str, str | None]]:
+        """Read the numeric and category values of an API record."""
+        return (
+            {
+                "timestamps": parse_timestamp(record["data"]),
+                "odometers": _odometer(record.get("odometro")),
+                "totals": record.get("valor_total") or 0,
+            },
+            {"category": None},
+        )
+
+    def merged(
+        self,
+        removed: Collection[Hashable],
+        updates: Iterable[tuple[Hashable, int, dict]],
+    ) -> HistoryColumns:
+        """Return new columns without the removed keys and with the updates.
+
+        Each update goes after the rows with the same or an earlier date.
+        The updates are sorted by date first, so the known rows are copied
+        over in runs between them: a single pass whatever order the API
+        returned the records in. These columns are left untouched.
+        """
+        base = self
+        if removed:
+            base = self._take(
+                [row for row, key in enumerate(self.keys) if key not in removed]
+            )
+        rows = sorted(
+            (
+                (*self.extract(record), key, fingerprint)
+                for key, fingerprint, record in updates
+            ),
+            key=lambda update: update[0]["timestamps"],
+        )
+
+        timestamps = [numeric["timestamps"] for numeric, *_ in rows]
+
+        columns = base._take([])
+        start = first = 0
+        while first < len(rows):
+            stop = bisect.bisect_right(base.timestamps, timestamps[first], start)
+            # The updates dated before the next known row go in together
+            last = len(rows)
+            if stop < len(base):
+                last = bisect.bisect_left(timestamps, base.timestamps[stop], first)
+            columns._extend(base, start, stop)
+            columns._append(rows[first:last])
+            start, first = stop, last
+        columns._extend(base, start, len(base))
+        return columns
+
+    def _take(self, rows: Sequence[int]) -> HistoryColumns:
+        """Return new columns holding the given rows."""
+        columns = type(self)()
+        columns.keys = [self.keys[row] for row in rows]
+        columns.fingerprints = array("L", [self.fingerprints[row] for row in rows])
+        for name, column in self.numeric.items():
+            columns.numeric[name] = array(
+                column.typecode, [column[row] for row in rows]
+            )
+        for name, column in self.categories.items():
+            columns.categories[name] = column.take(rows)
+        return columns
+
+    def _append(self, rows: Sequence[tuple[dict, dict, Hashable, int]]) -> None:
+        """Append extracted records with their keys and fingerprints."""
+        self.keys.extend([key for _, _, key, _ in rows])
+        self.fingerprints.extend([fingerprint for *_, fingerprint in rows])
+        for name, column in self.numeric.items():
+            column.extend([numeric[name] for numeric, *_ in rows])
+        for name, column in self.categories.items():
+            code = column.code
+            column.codes.extend([code(categories[name]) for _, categories, *_ in rows])
+
+    def _extend(self, other: HistoryColumns, start: int, stop: int) -> None:
+        """Append a run of rows of other columns sharing the category codes."""
+        if start == stop:
+            return
+        self.keys.extend(other.keys[start:stop])
+        self.fingerprints.extend(other.fingerprints[start:stop])
+        for name, column in other.numeric.items():
+            self.numeric[name].extend(column[start:stop])
+        for name, column in other.categories.items():
+            self.categories[name].codes.extend(column.codes[start:stop])
+
+    def as_dict(self) -> dict:
+        """Return the columns in a JSON serializable form."""
+        return {
+            "keys": self.keys,
+            "fingerprints": self.fingerprints.tolist(),
+            "numeric": {name: column.tolist() for name, column in self.numeric.items()},
+            "categories": {
+                name: column.as_dict() for name, column in self.categories.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> HistoryColumns:
+        """Restore columns saved with as_dict."""
+        columns = cls()
+        # JSON turns the (date, odometer) fallback keys into lists
+        columns.keys = [
+            tuple(key) if isinstance(key, list) else key for key in data["keys"]
+        ]
+        columns.fingerprints = array("L", data["fingerprints"])
+        for name, typecode in cls.NUMERIC.items():
+            columns.numeric[name] = array(typecode, data["numeric"][name])
+        for name in cls.CATEGORIES:
+            columns.categories[name] = CategoryColumn.from_dict(
+                data["categories"][name]
+            )
+        return columns
+
+
+class RefuellingColumns(HistoryColumns):
+    """Columns of a refuelling history."""
+
+    NUMERIC: ClassVar[dict[str, str]] = {
+        **HistoryColumns.NUMERIC,
+        "volumes": "d",
+        "prices": "d",
+        "tank_full": "b",
+    }
+    CATEGORIES = ("fuel", "reason", "station")
+    FIELDS = (
+        *HistoryColumns.FIELDS,
+        "volume",
+        "preco",
+        "tanque_cheio",
+        "combustivel",
+        "tipo_motivo",
+        "posto_combustivel",
+    )
+
+    @property
+    def volumes(self) -> array:
+        """Return the volume of every refuelling."""
+        return self.numeric["volumes"]
+
+    @property
+    def prices(self) -> array:
+        """Return the price per unit of every refuelling."""
+        return self.numeric["prices"]
+
+    @property
+    def tank_full(self) -> array:
+        """Return whether every refuelling filled the tank."""
+        return self.numeric["tank_full"]
+
+    def extract(self, record: dict) -> tuple[dict[str, Any], dict[str, str | None]]:
+        """Read the numeric and category values of a refuelling."""
+        numeric, _ = super().extract(record)
+        numeric["volumes"] = refuelling_volume(record)
+        numeric["prices"] = record["preco"]
+        numeric["tank_full"] = bool(record["tanque_cheio"])
+        return numeric, {
+            "fuel": name_of(record.get("combustivel")),
+            "reason": name_of(record.get("tipo_motivo")),
+            "station": name_of(record.get("posto_combustivel")),
+        }
+
+
+class ServiceColumns(HistoryColumns):
+    """Columns of a service history."""
+
+    FIELDS = (*HistoryColumns.FIELDS, "tipo_servico")
+
+    def extract(self, record: dict) -> tuple[dict[str, Any], dict[str, str | None]]:
+        """Read the numeric and category values of a service."""
+        numeric, _ = super().extract(record)
+        return numeric, {"category": name_of(record.get("tipo_servico"))}
+
+
+class ExpenseColumns(HistoryColumns):
+    """Columns of an expense history."""
+
+    FIELDS = (*HistoryColumns.FIELDS, "tipo_despesa")
+
+    def extract(self, record: dict) -> tuple[dict[str, Any], dict[str, str | None]]:
+        """Read the numeric and category values of an expense."""
+        numeric, _ = super().extract(record)
+        return numeric, {"category": name_of(record.get("tipo_despesa"))}
@@ -2,6 +2,7 @@ from collections.abc import Mapping
 import logging
 from typing import Any, Dict
 
+import aiohttp
 import voluptuous as vol
 
 from homeassistant import config_entries
@@ -15,13 +16,18 @@ from homeassistant.helpers.issue_registry import (
     async_delete_issue,
 )
 
-from . import auth, get_vehicles
+from . import async_check_credentials, async_get_session
+from .api import DrivvoApiError, DrivvoAuthError, DrivvoSession
+from .catalogue import async_get_catalogue, vehicle_labels
 from .const import (
     CONF_EMAIL,
     CONF_ID_VEHICLE,
     CONF_PASSWORD,
+    CONF_SETUP_CONCURRENCY,
     CONF_VEHICLES,
     DOMAIN,
+    MAX_SETUP_CONCURRENCY,
+    SETUP_CONCURRENCY,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -33,6 +39,14 @@ DATA_SCHEMA: vol.Schema = vol.Schema(
     }
 )
 
+CONCURRENCY_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Optional(CONF_SETUP_CONCURRENCY, default=SETUP_CONCURRENCY): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_SETUP_CONCURRENCY)
+        ),
+    }
+)
+
 
 class DrivvoOptionsFlowHandler(config_entries.OptionsFlow):
     """Config flow options for Drivvo."""
@@ -47,11 +61,17 @@ class DrivvoOptionsFlowHandler(config_entries.OptionsFlow):
         errors = {}
 
         if user_input is not None:
-            if await auth(
-                hass=self.hass,
-                user=user_input.get(CONF_EMAIL),
-                password=user_input.get(CONF_PASSWORD),
-            ):
+            try:
+                await async_check_credentials(
+                    self.hass,
+                    user_input.get(CONF_EMAIL),
+                    user_input.get(CONF_PASSWORD),
+                )
+            except DrivvoAuthError:
+                errors[CONF_PASSWORD] = "auth_error"
+            except (aiohttp.ClientError, DrivvoApiError, TimeoutError):
+                errors["base"] = "cannot_connect"
+            else:
                 vehicles = user_input.get(CONF_VEHICLES, [])
 
                 for vehicle in self.config_entry.data.get(CONF_VEHICLES):
@@ -80,6 +100,9 @@ class DrivvoOptionsFlowHandler(config_entries.OptionsFlow):
                         CONF_EMAIL: user_input.get(CONF_EMAIL),
                         CONF_PASSWORD: user_input.get(CONF_PASSWORD),
                         CONF_VEHICLES: vehicles,
+                        CONF_SETUP_CONCURRENCY: user_input.get(
+                            CONF_SETUP_CONCURRENCY, SETUP_CONCURRENCY
+                        ),
                     },
                 )
 
@@ -87,27 +110,21 @@ class DrivvoOptionsFlowHandler(config_entries.OptionsFlow):
 
                 return self.async_abort(reason="changes_successful")
 
-            errors[CONF_PASSWORD] = "auth_error"
-
-        token = await auth(
-            hass=self.hass,
-            user=self.config_entry.data.get(CONF_EMAIL),
-            password=self.config_entry.data.get(CONF_PASSWORD),
-            token=True,
+        # Loaded entries keep the catalogue fresh, so this rarely hits the API
+        session = async_get_session(
+            self.hass,
+            self.config_entry.data.get(CONF_EMAIL),
+            self.config_entry.data.get(CONF_PASSWORD),
         )
-        vehicles = await get_vehicles(self.hass, token)
-        resource_vehicle = {}
-        for vehicle in vehicles:
-            if vehicle["ativo"]:
-                vehicle_name = ""
-                if vehicle["nome"] is not None and vehicle["nome"] != "":
-                    vehicle_name += f"{vehicle['nome']} - "
-                if vehicle["placa"] is not None and vehicle["placa"] != "":
-                    vehicle_name += f"{vehicle['placa']} - "
-                vehicle_name += (
-                    f"{vehicle['marca']}/{vehicle['modelo']} ({vehicle['id_veiculo']})"
-                )
-                resource_vehicle[str(vehicle["id_veiculo"])] = vehicle_name
+        vehicles = None
+        try:
+            vehicles = await async_get_catalogue(self.hass).async_get_vehicles(session)
+        except DrivvoAuthError:
+            errors[CONF_PASSWORD] = "auth_error"
+        except (aiohttp.ClientError, DrivvoApiError, TimeoutError):
+            # The vehicles already configured can still be edited
+            errors["base"] = "cannot_connect"
+        resource_vehicle = vehicle_labels(vehicles or [])
 
         old_vehicles = []
 
@@ -134,7 +151,7 @@ class DrivvoOptionsFlowHandler(config_entries.OptionsFlow):
         return self.async_show_form(
             step_id="init",
             data_schema=self.add_suggested_values_to_schema(
-                SCHEMA_VEHICLES,
+                SCHEMA_VEHICLES.extend(CONCURRENCY_SCHEMA.schema),
                 user_input or self.config_entry.data,
             ),
             errors=errors,
@@ -148,7 +165,7 @@ class DrivvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     def __init__(self) -> None:
         """Initialize Drivvo config flow."""
-        self.token: str
+        self.session: DrivvoSession
         self.user: str
         self.password: str
 
@@ -193,19 +210,23 @@ class DrivvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             ]:
                 return self.async_abort(reason="already_configured")
 
-            if token := await auth(
-                hass=self.hass,
-                user=user_input.get(CONF_EMAIL),
-                password=user_input.get(CONF_PASSWORD),
-                token=True,
-            ):
+            session = async_get_session(
+                self.hass,
+                user_input.get(CONF_EMAIL),
+                user_input.get(CONF_PASSWORD),
+            )
+            try:
+                await session.async_get_token()
+            except DrivvoAuthError:
+                errors[CONF_PASSWORD] = "auth_error"
+            except (aiohttp.ClientError, DrivvoApiError, TimeoutError):
+                errors["base"] = "cannot_connect"
+            else:
                 self.user = user_input.get(CONF_EMAIL)
                 self.password = user_input.get(CONF_PASSWORD)
-                self.token = token
+                self.session = session
                 return await self.async_step_vehicle()
 
-            errors[CONF_PASSWORD] = "auth_error"
-
         return self.async_show_form(
             step_id="user",
             data_schema=self.add_suggested_values_to_schema(
@@ -231,20 +252,25 @@ class DrivvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 },
             )
 
-        vehicles = await get_vehicles(self.hass, self.token)
-        resource_vehicle = {}
-        _LOGGER.debug("Veiculos: %s", vehicles)
-        for vehicle in vehicles:
-            if vehicle["ativo"]:
-                vehicle_name = ""
-                if vehicle["nome"] is not None and vehicle["nome"] != "":
-                    vehicle_name += f"{vehicle['nome']} - "
-                if vehicle["placa"] is not None and vehicle["placa"] != "":
-                    vehicle_name += f"{vehicle['placa']} - "
-                vehicle_name += (
-                    f"{vehicle['marca']}/{vehicle['modelo']} ({vehicle['id_veiculo']})"
-                )
-                resource_vehicle[str(vehicle["id_veiculo"])] = vehicle_name
+        try:
+            vehicles = await async_get_catalogue(self.hass).async_get_vehicles(
+                self.session
+            )
+        except DrivvoAuthError:
+            errors[CONF_PASSWORD] = "auth_error"
+        except (aiohttp.ClientError, DrivvoApiError, TimeoutError):
+            errors["base"] = "cannot_connect"
+        if errors:
+            # Back to the credentials, to try again
+            return self.async_show_form(
+                step_id="user",
+                data_schema=self.add_suggested_values_to_schema(
+                    DATA_SCHEMA,
+                    {CONF_EMAIL: self.user, CONF_PASSWORD: self.password},
+                ),
+                errors=errors,
+            )
+        resource_vehicle = vehicle_labels(vehicles or [])
 
         if len(resource_vehicle) == 0:
             return self.async_create_entry(
@@ -283,17 +309,26 @@ class DrivvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
         assert self._reauth_entry
         if user_input is not None:
-            if await auth(
-                hass=self.hass,
-                user=user_input.get(CONF_EMAIL),
-                password=user_input.get(CONF_PASSWORD),
-            ):
+            try:
+                await async_check_credentials(
+                    self.hass,
+                    user_input.get(CONF_EMAIL),
+                    user_input.get(CONF_PASSWORD),
+                )
+            except DrivvoAuthError:
+                errors[CONF_PASSWORD] = "auth_error"
+            except (aiohttp.ClientError, DrivvoApiError, TimeoutError):
+                errors["base"] = "cannot_connect"
+            else:
                 self.hass.config_entries.async_update_entry(
                     self._reauth_entry,
                     data={
                         CONF_EMAIL: user_input.get(CONF_EMAIL),
                         CONF_PASSWORD: user_input.get(CONF_PASSWORD),
                         CONF_VEHICLES: self._reauth_entry.data.get(CONF_VEHICLES),
+                        CONF_SETUP_CONCURRENCY: self._reauth_entry.data.get(
+                            CONF_SETUP_CONCURRENCY, SETUP_CONCURRENCY
+                        ),
                     },
                 )
 
@@ -301,8 +336,6 @@ class DrivvoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
                 return self.async_abort(reason="reauth_successful")
 
-            errors[CONF_PASSWORD] = "auth_error"
-
         return self.async_show_form(
             step_id="reauth_confirm",
             data_schema=self.add_suggested_values_to_schema(
@@ -2,6 +2,17 @@ from datetime import timedelta
 
 ICON = "mdi:gas-station"
 SCAN_INTERVAL = timedelta(days=1)
+MIN_SCAN_INTERVAL = timedelta(hours=2)
+MAX_SCAN_INTERVAL = timedelta(days=3)
+POLL_RATE_WINDOW = timedelta(days=90)
+POLLS_PER_EVENT = 8
+SCAN_JITTER = 0.1
+ACCOUNT_SCAN_INTERVAL = timedelta(hours=12)
+SETUP_CONCURRENCY = 4
+MAX_SETUP_CONCURRENCY = 16
+SETUP_RETRY_INTERVAL = timedelta(minutes=10)
+EFFICIENCY_ROLLING_SEGMENTS = 5
+ANALYTICS_WINDOWS = (timedelta(days=30), timedelta(days=90), timedelta(days=365))
 ATTRIBUTION = "Data provided by drivvo api"
 DOMAIN = "drivvo"
 CONF_EMAIL = "email"
@@ -9,5 +20,30 @@ CONF_PASSWORD = "password"
 CONF_MODEL = "model"
 CONF_ID_VEHICLE = "id_vehicle"
 CONF_VEHICLES = "vehicles"
+CONF_SETUP_CONCURRENCY = "setup_concurrency"
 LOGIN_BASE_URL = "https://api.drivvo.com/autenticacao/login"
 BASE_URL = "https://api.drivvo.com/"
+TOKEN_LIFETIME = timedelta(hours=12)
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=1)
+REQUEST_RATE = 5.0
+REQUEST_BURST = 20
+REQUEST_RETRIES = 3
+REQUEST_TIMEOUT = timedelta(seconds=30)
+REFRESH_TIMEOUT = timedelta(minutes=2)
+RETRY_BACKOFF_BASE = timedelta(seconds=1)
+RETRY_BACKOFF_MAX = timedelta(seconds=30)
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = timedelta(minutes=5)
+SCHEDULER_CONCURRENCY = 8
+SCHEDULER_ACCOUNT_CONCURRENCY = 4
+DATA_SESSIONS = f"{DOMAIN}_sessions"
+DATA_CATALOGUE = f"{DOMAIN}_catalogue"
+DATA_SCHEDULER = f"{DOMAIN}_scheduler"
+DATA_STORES = f"{DOMAIN}_stores"
+CATALOGUE_TTL = timedelta(hours=24)
+STORAGE_VERSION = 7
+STORAGE_SAVE_DELAY = 60
+DECODE_EXECUTOR_THRESHOLD = 256 * 1024
+DEBUG_PAYLOAD_LIMIT = 2048
+HISTOGRAM_WINDOW = 256
+STATISTICS_BATCH_SIZE = 1000
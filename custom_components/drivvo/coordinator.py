@@ -0,0 +1,325 @@
+"""Account-level data for the Drivvo integration."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import aiohttp
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+
+from .api import DrivvoApiError, DrivvoAuthError, DrivvoSession
+from .catalogue import async_get_catalogue
+from .const import (
+    ACCOUNT_SCAN_INTERVAL,
+    CONF_SETUP_CONCURRENCY,
+    REFRESH_TIMEOUT,
+    SCAN_INTERVAL,
+    SETUP_CONCURRENCY,
+    SETUP_RETRY_INTERVAL,
+)
+from .history import VehicleHistory
+from .payload import log_payload
+from .polling import jittered, next_refresh_interval
+from .store import async_get_store
+
+if TYPE_CHECKING:
+    from . import DrivvoDataVehicle
+
+_LOGGER = logging.getLogger(__name__)
+
+_DataT = TypeVar("_DataT")
+
+
+def parse_currency(api_data_config: Any) -> str | None:
+    """Extract the currency format from the /configuracao payload."""
+    if api_data_config is None:
+        return None
+
+    if not isinstance(api_data_config, list) or len(api_data_config) == 0:
+        _LOGGER.warning(
+            "API config data is not a list or is empty: %s", api_data_config
+        )
+        return None
+
+    if not isinstance(api_data_config[0], dict):
+        _LOGGER.warning("API config data is not a dictionary: %s", api_data_config[0])
+        return None
+
+    return api_data_config[0].get("formato_valor", None)
+
+
+@dataclasses.dataclass
+class DrivvoAccountData:
+    """Resources shared by every vehicle of an account."""
+
+    vehicles: list[dict]
+    currency: str | None
+
+
+class DrivvoCoordinator(DataUpdateCoordinator[_DataT]):
+    """Coordinator whose refreshes are bounded by REFRESH_TIMEOUT.
+
+    The deadline covers every request of a refresh, retries included, and
+    shutting the coordinator down cancels a refresh still in flight. Until
+    a refresh succeeds, failed ones are retried after SETUP_RETRY_INTERVAL
+    rather than the regular interval.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the coordinator."""
+        super().__init__(*args, **kwargs)
+        self.timeouts = 0
+        self._refresh_task: asyncio.Task | None = None
+
+    async def _async_update_data(self) -> _DataT:
+        """Fetch the data before the refresh deadline."""
+        self._refresh_task = asyncio.current_task()
+        try:
+            async with asyncio.timeout(REFRESH_TIMEOUT.total_seconds()):
+                return await self._async_fetch()
+        except TimeoutError as err:
+            self.timeouts += 1
+            self._async_retry_soon()
+            raise UpdateFailed(f"Timed out fetching {self.name}") from err
+        except UpdateFailed:
+            self._async_retry_soon()
+            raise
+        finally:
+            self._refresh_task = None
+
+    @callback
+    def _async_retry_soon(self) -> None:
+        """Retry shortly when nothing was fetched yet."""
+        if self.data is None:
+            self.update_interval = jittered(SETUP_RETRY_INTERVAL)
+
+    async def _async_fetch(self) -> _DataT:
+        """Fetch the data with the update method."""
+        return await super()._async_update_data()
+
+    async def async_shutdown(self) -> None:
+        """Stop refreshing and abort the refresh in flight."""
+        await super().async_shutdown()
+        task = self._refresh_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+
+class DrivvoAccountCoordinator(DrivvoCoordinator[DrivvoAccountData]):
+    """Refresh the account-wide resources on their own schedule."""
+
+    def __init__(self, hass: HomeAssistant, session: DrivvoSession) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"Drivvo account {session.email}",
+            update_interval=jittered(ACCOUNT_SCAN_INTERVAL),
+        )
+        self.session = session
+
+    async def _async_fetch(self) -> DrivvoAccountData:
+        """Fetch the vehicle list and the account configuration."""
+        try:
+            vehicles, api_data_config = await asyncio.gather(
+                self.session.async_get("veiculo/web"),
+                self.session.async_get("configuracao"),
+            )
+        except DrivvoAuthError as err:
+            raise ConfigEntryAuthFailed("Invalid authentication") from err
+        except (aiohttp.ClientError, DrivvoApiError, ValueError) as err:
+            raise UpdateFailed(f"Error fetching Drivvo account data: {err}") from err
+
+        currency = parse_currency(api_data_config)
+        log_payload(
+            _LOGGER, "API Response config (currency=%s): %s", currency, api_data_config
+        )
+
+        if vehicles is None and self.data is not None:
+            vehicles = self.data.vehicles
+        elif vehicles is not None:
+            async_get_catalogue(self.hass).set(self.session.email, vehicles)
+
+        self.update_interval = jittered(ACCOUNT_SCAN_INTERVAL)
+        return DrivvoAccountData(vehicles=vehicles or [], currency=currency)
+
+
+def changed_fields(old: Any, new: Any) -> frozenset[str]:
+    """Return the names of the fields that differ between two snapshots."""
+    if old is None or new is None:
+        snapshot = new if new is not None else old
+        if snapshot is None:
+            return frozenset()
+        return frozenset(
+            field.name for field in dataclasses.fields(snapshot) if field.compare
+        )
+    return frozenset(
+        field.name
+        for field in dataclasses.fields(new)
+        if field.compare and getattr(old, field.name) != getattr(new, field.name)
+    )
+
+
+class DrivvoVehicleCoordinator(DrivvoCoordinator["DrivvoDataVehicle | None"]):
+    """Refresh one vehicle and track which of its fields changed.
+
+    Listeners are not called when a refresh returns an equal snapshot,
+    and changed_fields lets each entity skip writes it does not need.
+    The refresh interval follows how active the vehicle is.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        name: str,
+        history: VehicleHistory,
+        update_method: Callable[[], Awaitable[DrivvoDataVehicle | None]],
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=name,
+            update_interval=jittered(SCAN_INTERVAL),
+            update_method=update_method,
+            always_update=False,
+        )
+        self.history = history
+        self.changed_fields: frozenset[str] = frozenset()
+
+    async def _async_update_data(self) -> DrivvoDataVehicle | None:
+        """Fetch the vehicle and diff it with the previous snapshot."""
+        data = await super()._async_update_data()
+        self.changed_fields = changed_fields(self.data, data)
+        self.update_interval = next_refresh_interval(self.history.timeline, time.time())
+        return data
+
+    @callback
+    def async_set_updated_data(self, data: DrivvoDataVehicle | None) -> None:
+        """Push a snapshot, diffing it with the previous one."""
+        self.changed_fields = changed_fields(self.data, data)
+        super().async_set_updated_data(data)
+
+
+class DrivvoAccount:
+    """Runtime data of a config entry, stored in hass.data[DOMAIN][entry_id]."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        session: DrivvoSession,
+    ) -> None:
+        """Initialize the account."""
+        self.hass = hass
+        self.entry = entry
+        self.config: Mapping[str, Any] = entry.data
+        self.session = session
+        self.coordinator = DrivvoAccountCoordinator(hass, session)
+        self.vehicle_coordinators: dict[str, DrivvoVehicleCoordinator] = {}
+        self.histories: dict[str, VehicleHistory] = {}
+        self.store = async_get_store(hass, entry.entry_id)
+        self._backfill_locks: dict[str, asyncio.Lock] = {}
+        self._backfill_rows: dict[str, dict[str, dict[str, float]]] = {}
+
+    async def async_load(self, snapshot_factory: Callable[[dict], Any]) -> None:
+        """Restore the vehicle histories saved by a previous run."""
+        self.histories = await self.store.async_load(snapshot_factory)
+
+    async def async_first_refresh(self) -> None:
+        """Check the credentials with the account refresh, then fetch the vehicles.
+
+        Runs in the background once the entities exist. Invalid credentials
+        start a reauthentication instead of fetching every vehicle.
+        """
+        await self.coordinator.async_refresh()
+        if isinstance(self.coordinator.last_exception, ConfigEntryAuthFailed):
+            return
+
+        semaphore = asyncio.Semaphore(
+            self.config.get(CONF_SETUP_CONCURRENCY, SETUP_CONCURRENCY)
+        )
+
+        async def _async_refresh(coordinator: DrivvoVehicleCoordinator) -> None:
+            async with semaphore:
+                await coordinator.async_refresh()
+
+        await asyncio.gather(
+            *(
+                _async_refresh(coordinator)
+                for coordinator in self.vehicle_coordinators.values()
+            )
+        )
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Persist the vehicle histories once the current burst settles."""
+        self.store.async_schedule_save(self.histories)
+
+    @callback
+    def async_schedule_backfill(self, vehicle: str, data: Any) -> None:
+        """Import the new history of a vehicle into long-term statistics."""
+        if "recorder" not in self.hass.config.components:
+            return
+        lock = self._backfill_locks.setdefault(vehicle, asyncio.Lock())
+
+        async def _async_backfill() -> None:
+            # Imported lazily, as it pulls in the recorder
+            from .backfill import async_backfill_vehicle
+
+            async with lock:
+                await async_backfill_vehicle(
+                    self.hass,
+                    vehicle,
+                    self.histories[vehicle],
+                    data,
+                    self._backfill_rows.setdefault(vehicle, {}),
+                )
+
+        self.entry.async_create_background_task(
+            self.hass, _async_backfill(), f"Drivvo statistics {vehicle}"
+        )
+
+    async def async_shutdown(self) -> None:
+        """Stop the coordinators, then save what they fetched.
+
+        The refreshes in flight are aborted, and the delayed save is written
+        right away so a reload sets the entities up from the cache.
+        """
+        await asyncio.gather(
+            self.coordinator.async_shutdown(),
+            *(
+                coordinator.async_shutdown()
+                for coordinator in self.vehicle_coordinators.values()
+            ),
+        )
+        await self.store.async_flush()
+
+    @property
+    def currency(self) -> str | None:
+        """Return the currency format of the account."""
+        if self.coordinator.data is None:
+            return None
+        return self.coordinator.data.currency
+
+    @callback
+    def async_handle_account_update(self) -> None:
+        """Push a changed currency to the vehicles without refetching them."""
+        currency = self.currency
+        for coordinator in self.vehicle_coordinators.values():
+            if coordinator.data is not None and coordinator.data.currency != currency:
+                coordinator.async_set_updated_data(
+                    dataclasses.replace(coordinator.data, currency=currency)
+                )
@@ -0,0 +1,46 @@
+"""Diagnostics support for the Drivvo integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_EMAIL, CONF_PASSWORD, DOMAIN
+from .coordinator import DrivvoAccount, DrivvoCoordinator
+from .scheduler import async_get_scheduler
+
+TO_REDACT = {CONF_EMAIL, CONF_PASSWORD, "title", "unique_id"}
+
+
+def _coordinator_diagnostics(coordinator: DrivvoCoordinator) -> dict[str, Any]:
+    """Return the refresh state of a coordinator."""
+    return {
+        "last_update_success": coordinator.last_update_success,
+        "update_interval": (
+            coordinator.update_interval.total_seconds()
+            if coordinator.update_interval is not None
+            else None
+        ),
+        "timeouts": coordinator.timeouts,
+    }
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    account: DrivvoAccount = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "request_timeouts": account.session.timeouts,
+        "metrics": account.session.metrics.as_dict(),
+        "scheduler": async_get_scheduler(hass).as_dict(account.session.email.lower()),
+        "account": _coordinator_diagnostics(account.coordinator),
+        "vehicles": {
+            vehicle: _coordinator_diagnostics(coordinator)
+            for vehicle, coordinator in account.vehicle_coordinators.items()
+        },
+    }
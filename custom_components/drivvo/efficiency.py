@@ -0,0 +1,208 @@
+"""Tank-to-tank fuel efficiency over the whole refuelling history."""
+
+from __future__ import annotations
+
+from array import array
+import bisect
+import dataclasses
+
+from .columns import MISSING_ODOMETER, RefuellingColumns
+from .const import EFFICIENCY_ROLLING_SEGMENTS
+from .units import UnitOfFuelEfficiency
+
+LITERS_PER_GALLON = 3.785411784
+# The vehicle payload has no volume unit: volumes are taken to be in liters
+VOLUME_UNIT = "L"
+
+
+@dataclasses.dataclass(frozen=True)
+class EfficiencyStats:
+    """Fuel efficiency of a vehicle, in its distance unit per liter."""
+
+    segments: int = 0
+    last: float | None = None
+    overall: float | None = None
+    best: float | None = None
+    worst: float | None = None
+    median: float | None = None
+    rolling: float | None = None
+
+
+class EfficiencyEngine:
+    """Fuel efficiency of every tank-to-tank segment of a refuelling history.
+
+    A segment runs from a full tank to the next full tank at another
+    odometer, and burnt what was put in after the first one, up to and
+    including the second. Fuel put in before the first full tank cannot
+    be attributed to a distance and is left out.
+
+    The segments are kept in date order with their results, so refuellings
+    added to the history only recompute the segments from their date on:
+    for a new refuelling, the one it closes or extends.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an engine without segments."""
+        self.distances = array("d")
+        self.volumes = array("d")
+        self.efficiencies = array("d")
+        # Date and row of the last refuelling of each segment
+        self.ends = array("q")
+        self.end_rows = array("q")
+        self._sorted: array | None = array("d")
+        self._distance_total = 0.0
+        self._volume_total = 0.0
+        # Open segment: odometer of the last full tank and volume put in since,
+        # and whether that full tank closed the last segment
+        self._full_odometer: int | None = None
+        self._open_volume = 0.0
+        self._closed = False
+
+    def __len__(self) -> int:
+        """Return the number of segments."""
+        return len(self.efficiencies)
+
+    @classmethod
+    def from_columns(cls, columns: RefuellingColumns) -> EfficiencyEngine:
+        """Split a whole refuelling history into segments."""
+        engine = cls()
+        engine._sorted = None
+        for row in range(len(columns)):
+            engine.feed_row(columns, row)
+        # Sorted once, rather than kept sorted while splitting
+        engine._sorted = array("d", sorted(engine.efficiencies))
+        return engine
+
+    def update(self, columns: RefuellingColumns, since: int) -> None:
+        """Recompute the segments after refuellings dated since on changed.
+
+        The rows dated before since must be the ones the engine was fed.
+        """
+        keep = bisect.bisect_left(self.ends, since)
+        for segment in range(keep, len(self)):
+            self._sorted.pop(
+                bisect.bisect_left(self._sorted, self.efficiencies[segment])
+            )
+            self._distance_total -= self.distances[segment]
+            self._volume_total -= self.volumes[segment]
+        for column in (
+            self.distances,
+            self.volumes,
+            self.efficiencies,
+            self.ends,
+            self.end_rows,
+        ):
+            del column[keep:]
+
+        start = 0
+        self._full_odometer = None
+        self._closed = False
+        if not keep:
+            self._distance_total = self._volume_total = 0.0
+        else:
+            start = self.end_rows[-1] + 1
+            self._full_odometer = columns.odometers[start - 1]
+            self._closed = True
+        self._open_volume = 0.0
+        for row in range(start, len(columns)):
+            self.feed_row(columns, row)
+
+    def feed_row(self, columns: RefuellingColumns, row: int) -> None:
+        """Account for the next refuelling in date order."""
+        volume = columns.volumes[row]
+        odometer = columns.odometers[row]
+        # A full tank without an odometer cannot end a segment
+        if not columns.tank_full[row] or odometer == MISSING_ODOMETER:
+            if self._full_odometer is not None:
+                self._open_volume += volume
+            return
+
+        volume += self._open_volume
+        self._open_volume = 0.0
+        if self._full_odometer is None:
+            self._full_odometer = odometer
+        elif odometer != self._full_odometer:
+            distance = odometer - self._full_odometer
+            self._full_odometer = odometer
+            # An odometer going backwards or no volume make no segment
+            self._closed = distance > 0 and volume > 0
+            if self._closed:
+                self._add(distance, volume, columns.timestamps[row], row)
+        elif self._closed:
+            # Another full tank at the same odometer extends the same segment
+            distance = self.distances[-1]
+            volume += self.volumes[-1]
+            self._remove_last()
+            self._add(distance, volume, columns.timestamps[row], row)
+
+    def _add(self, distance: float, volume: float, end: int, row: int) -> None:
+        """Append a segment."""
+        efficiency = distance / volume
+        self.distances.append(distance)
+        self.volumes.append(volume)
+        self.efficiencies.append(efficiency)
+        self.ends.append(end)
+        self.end_rows.append(row)
+        if self._sorted is not None:
+            bisect.insort(self._sorted, efficiency)
+        self._distance_total += distance
+        self._volume_total += volume
+
+    def _remove_last(self) -> None:
+        """Drop the last segment."""
+        if self._sorted is not None:
+            self._sorted.pop(bisect.bisect_left(self._sorted, self.efficiencies[-1]))
+        self._distance_total -= self.distances.pop()
+        self._volume_total -= self.volumes.pop()
+        self.efficiencies.pop()
+        self.ends.pop()
+        self.end_rows.pop()
+
+    def result(self, rolling: int = EFFICIENCY_ROLLING_SEGMENTS) -> EfficiencyStats:
+        """Return the efficiency of the segments, rolling over the last ones."""
+        segments = len(self)
+        if segments == 0:
+            return EfficiencyStats()
+
+        middle = segments // 2
+        if segments % 2:
+            median = self._sorted[middle]
+        else:
+            median = (self._sorted[middle - 1] + self._sorted[middle]) / 2
+        return EfficiencyStats(
+            segments=segments,
+            last=self.efficiencies[-1],
+            overall=self._distance_total / self._volume_total,
+            best=self._sorted[-1],
+            worst=self._sorted[0],
+            median=median,
+            rolling=sum(self.distances[-rolling:]) / sum(self.volumes[-rolling:]),
+        )
+
+
+def efficiency_unit(distance_unit: str | None) -> UnitOfFuelEfficiency:
+    """Return the efficiency unit of a vehicle measuring distances in a unit."""
+    if distance_unit == "mi":
+        return UnitOfFuelEfficiency.MILES_PER_GALLON
+    return UnitOfFuelEfficiency.KILOMETERS_PER_LITER
+
+
+def convert_efficiency(value: float | None, distance_unit: str | None) -> float | None:
+    """Convert an efficiency per liter to the efficiency unit of a vehicle.
+
+    The volumes recorded are assumed to be in liters: a vehicle in miles
+    refuelled in gallons would be converted twice.
+    """
+    if value is None:
+        return None
+    if efficiency_unit(distance_unit) == UnitOfFuelEfficiency.MILES_PER_GALLON:
+        return value * LITERS_PER_GALLON
+    return value
+
+
+def efficiency_attributes(distance_unit: str | None) -> dict[str, object]:
+    """Return the volume unit an efficiency is computed from, as attributes."""
+    attributes: dict[str, object] = {"volume_unit": VOLUME_UNIT}
+    if efficiency_unit(distance_unit) == UnitOfFuelEfficiency.MILES_PER_GALLON:
+        attributes["liters_per_gallon"] = LITERS_PER_GALLON
+    return attributes
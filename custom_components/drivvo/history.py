@@ -0,0 +1,400 @@
+"""Locally held Drivvo histories, kept up to date with delta merges."""
+
+from __future__ import annotations
+
+import bisect
+import dataclasses
+import zlib
+from collections.abc import Callable, Hashable, Sequence
+from typing import Any
+
+from .aggregates import CostAggregator, RefuellingAggregator
+from .analytics import PrefixIndex
+from .columns import (
+    ExpenseColumns,
+    HistoryColumns,
+    RefuellingColumns,
+    ServiceColumns,
+    parse_timestamp,
+)
+from .efficiency import EfficiencyEngine
+from .timeline import VehicleTimeline
+
+HISTORY_REFUELLINGS = "abastecimento"
+HISTORY_SERVICES = "servico"
+HISTORY_EXPENSES = "despesa"
+HISTORY_KINDS = (HISTORY_REFUELLINGS, HISTORY_SERVICES, HISTORY_EXPENSES)
+COST_KINDS = (HISTORY_SERVICES, HISTORY_EXPENSES)
+
+HISTORY_COLUMNS: dict[str, type[HistoryColumns]] = {
+    HISTORY_REFUELLINGS: RefuellingColumns,
+    HISTORY_SERVICES: ServiceColumns,
+    HISTORY_EXPENSES: ExpenseColumns,
+}
+
+_ID_FIELDS = ("id", "id_abastecimento", "id_servico", "id_despesa")
+
+
+def record_key(record: dict) -> Hashable:
+    """Return the identity of a history record."""
+    for field in _ID_FIELDS:
+        if record.get(field) is not None:
+            return record[field]
+    return (record.get("data"), record.get("odometro"))
+
+
+def record_fingerprint(record: dict, fields: Sequence[str] | None = None) -> int:
+    """Return a checksum of a record that is stable across restarts.
+
+    With fields, only those are checksummed, so edits to fields nothing
+    reads do not count as changes. The repr of a decoded record is about
+    twice as fast to build as its JSON. It follows the order of the fields
+    in the payload, so an API reordering them would only make every record
+    look changed once.
+    """
+    if fields is not None:
+        return zlib.crc32(repr(tuple(map(record.get, fields))).encode())
+    return zlib.crc32(repr(record).encode())
+
+
+@dataclasses.dataclass
+class HistoryDelta:
+    """Records that changed between two syncs of a history."""
+
+    added: list[dict] = dataclasses.field(default_factory=list)
+    changed: list[dict] = dataclasses.field(default_factory=list)
+    removed: list[Hashable] = dataclasses.field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        """Return True if anything changed."""
+        return bool(self.added or self.changed or self.removed)
+
+    def since(self) -> int | None:
+        """Return the oldest date of the added records.
+
+        None means a record changed or was removed, so the rows it used to
+        take are not known anymore.
+        """
+        if self.changed or self.removed or not self.added:
+            return None
+        return min(parse_timestamp(record["data"]) for record in self.added)
+
+
+def _next_token(body: bytes, position: int, step: int) -> bytes:
+    """Return the first byte of a body from a position on that is not a space."""
+    while 0 <= position < len(body) and body[position] in b" \t\r\n":
+        position += step
+    return body[position : position + 1] if position >= 0 else b""
+
+
+class HistorySync:
+    """Local copy of one history endpoint of a vehicle.
+
+    Records are kept as typed columns ordered by date, identified by their
+    key and checksum only, so a sync only reads the records that were
+    added or changed upstream. A sync builds new columns rather than
+    changing the current ones in place.
+
+    The API lists a history in date order, so new records come first or
+    last in the body. The CRC32 of the records of the last body merged,
+    the bytes between its brackets, tells whether a new body starts or
+    ends with the same ones: they are then unchanged and only the new
+    records are read.
+    """
+
+    def __init__(self, columns: HistoryColumns) -> None:
+        """Initialize the history."""
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        # CRC32 of the last body merged, for APIs answering 200 unchanged
+        self.checksum: int | None = None
+        # Size and record count of the last body merged, and CRC32 of the
+        # bytes between its brackets
+        self.body_size = 0
+        self.body_records = 0
+        self.records_checksum: int | None = None
+        self.columns = columns
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self.columns)
+
+    def as_dict(self) -> dict:
+        """Return the history in a JSON serializable form."""
+        return {
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "checksum": self.checksum,
+            "body_size": self.body_size,
+            "body_records": self.body_records,
+            "records_checksum": self.records_checksum,
+            "columns": self.columns.as_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, kind: str, data: dict) -> HistorySync:
+        """Restore a history saved with as_dict."""
+        history = cls(HISTORY_COLUMNS[kind].from_dict(data["columns"]))
+        history.etag = data.get("etag")
+        history.last_modified = data.get("last_modified")
+        history.checksum = data.get("checksum")
+        history.body_size = data.get("body_size", 0)
+        history.body_records = data.get("body_records", 0)
+        history.records_checksum = data.get("records_checksum")
+        return history
+
+    def merge(self, payload: list[dict], body: bytes | None = None) -> HistoryDelta:
+        """Merge a full upstream payload, returning what changed.
+
+        The body the payload was decoded from, if given, lets records
+        appended to the last body merged skip reading the others.
+        """
+        delta = None
+        checksum = None
+        if body is not None:
+            new = self._appended(body, len(payload))
+            if new is not None:
+                delta = self._merge_appended(payload[new])
+            if delta is not None and new.start:
+                # The records of the last body lead this one: only the new
+                # bytes are left to checksum
+                checksum = zlib.crc32(
+                    memoryview(body)[self.body_size - 1 : -1], self.records_checksum
+                )
+        if delta is None:
+            delta = self._merge_all(payload)
+        self._remember_body(body, len(payload), checksum)
+        return delta
+
+    def _appended(self, body: bytes, records: int) -> slice | None:
+        """Return where the records new since the last body are in a body.
+
+        None means the body does not extend the last one.
+        """
+        size = self.body_size
+        if not size or len(body) <= size or records <= self.body_records:
+            return None
+        view = memoryview(body)
+        if (
+            _next_token(body, size - 1, 1) == b","
+            and zlib.crc32(view[1 : size - 1]) == self.records_checksum
+        ):
+            return slice(self.body_records, records)
+        if (
+            _next_token(body, len(body) - size, -1) == b","
+            and zlib.crc32(view[1 - size : -1]) == self.records_checksum
+        ):
+            return slice(0, records - self.body_records)
+        return None
+
+    def _remember_body(
+        self, body: bytes | None, records: int, checksum: int | None = None
+    ) -> None:
+        """Keep what tells whether the next body extends this one."""
+        if body is None or body[:1] != b"[" or body[-1:] != b"]":
+            self.body_size = self.body_records = 0
+            self.records_checksum = None
+            return
+        self.body_size = len(body)
+        self.body_records = records
+        if checksum is None:
+            checksum = zlib.crc32(memoryview(body)[1:-1])
+        self.records_checksum = checksum
+
+    def _merge_appended(self, records: list[dict]) -> HistoryDelta | None:
+        """Add the records appended to the last body merged.
+
+        None means one of them is already known, so the body has to be
+        merged as a whole.
+        """
+        columns = self.columns
+        fields = columns.FIELDS
+        known = set(columns.keys)
+        updates = []
+        for record in records:
+            key = record_key(record)
+            if key in known:
+                return None
+            known.add(key)
+            updates.append((key, record_fingerprint(record, fields), record))
+        if updates:
+            self.columns = columns.merged((), updates)
+        return HistoryDelta(added=records)
+
+    def _merge_all(self, payload: list[dict]) -> HistoryDelta:
+        """Merge a payload, comparing every record with the known ones."""
+        columns = self.columns
+        fields = columns.FIELDS
+        known = dict(zip(columns.keys, columns.fingerprints, strict=True))
+        delta = HistoryDelta()
+        updates = []
+
+        for record in payload:
+            key = record_key(record)
+            fingerprint = record_fingerprint(record, fields)
+            previous = known.pop(key, None)
+            if previous == fingerprint:
+                continue
+            if previous is None:
+                delta.added.append(record)
+            else:
+                delta.changed.append(record)
+            updates.append((key, fingerprint, record))
+
+        # Whatever the payload no longer holds was deleted upstream
+        delta.removed.extend(known)
+        if updates or delta.removed:
+            self.columns = columns.merged(
+                {*delta.removed, *(record_key(record) for record in delta.changed)},
+                updates,
+            )
+        return delta
+
+
+class VehicleHistory:
+    """Everything kept between refreshes of one vehicle."""
+
+    def __init__(self) -> None:
+        """Initialize an empty vehicle history."""
+        self.histories = {
+            kind: HistorySync(HISTORY_COLUMNS[kind]()) for kind in HISTORY_KINDS
+        }
+        self.refuelling_aggregator = RefuellingAggregator()
+        self.efficiency = EfficiencyEngine()
+        self.cost_aggregators = {kind: CostAggregator() for kind in COST_KINDS}
+        self.prefix_indexes = {kind: PrefixIndex() for kind in HISTORY_KINDS}
+        self.vehicle_fingerprint: int | None = None
+        self.currency: str | None = None
+        # Bumped by every merge that changed a history, and recorded on the
+        # snapshot built from it: a merge finishing after its refresh failed
+        # or timed out still gets a new snapshot on the next refresh
+        self.version = 0
+        self.snapshot: Any = None
+        self._timeline: VehicleTimeline | None = None
+        self._timeline_columns: tuple[HistoryColumns, ...] = ()
+
+    def as_dict(self) -> dict:
+        """Return the vehicle history in a JSON serializable form."""
+        return {
+            "histories": {
+                kind: history.as_dict() for kind, history in self.histories.items()
+            },
+            "vehicle_fingerprint": self.vehicle_fingerprint,
+            "currency": self.currency,
+            "version": self.version,
+            "snapshot": (
+                self.snapshot.as_dict() if self.snapshot is not None else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict, snapshot_factory: Callable[[dict], Any]
+    ) -> VehicleHistory:
+        """Restore a vehicle history saved with as_dict."""
+        history = cls()
+        for kind, stored in data["histories"].items():
+            history.histories[kind] = HistorySync.from_dict(kind, stored)
+        history.refuelling_aggregator = RefuellingAggregator.from_columns(
+            history.refuellings.columns
+        )
+        history.efficiency = EfficiencyEngine.from_columns(history.refuellings.columns)
+        history.cost_aggregators = {
+            kind: CostAggregator.from_columns(history.histories[kind].columns)
+            for kind in COST_KINDS
+        }
+        history.prefix_indexes = {
+            kind: PrefixIndex.from_columns(sync.columns)
+            for kind, sync in history.histories.items()
+        }
+        history.vehicle_fingerprint = data.get("vehicle_fingerprint")
+        history.currency = data.get("currency")
+        history.version = data.get("version", 0)
+        if data.get("snapshot") is not None:
+            history.snapshot = snapshot_factory(data["snapshot"])
+        return history
+
+    @property
+    def refuellings(self) -> HistorySync:
+        """Return the refuelling history."""
+        return self.histories[HISTORY_REFUELLINGS]
+
+    @property
+    def services(self) -> HistorySync:
+        """Return the service history."""
+        return self.histories[HISTORY_SERVICES]
+
+    @property
+    def expenses(self) -> HistorySync:
+        """Return the expense history."""
+        return self.histories[HISTORY_EXPENSES]
+
+    @property
+    def timeline(self) -> VehicleTimeline:
+        """Return every event of the vehicle in date order.
+
+        A merge replaces the columns of a history rather than changing
+        them, so the timeline is rebuilt when it was not built from the
+        current columns; a merge running in the executor meanwhile cannot
+        leave a stale timeline behind.
+        """
+        columns = tuple(history.columns for history in self.histories.values())
+        if self._timeline is None or any(
+            built is not current
+            for built, current in zip(self._timeline_columns, columns, strict=True)
+        ):
+            self._timeline = VehicleTimeline(columns)
+            self._timeline_columns = columns
+        return self._timeline
+
+    def merge(
+        self, kind: str, payload: list[dict], body: bytes | None = None
+    ) -> HistoryDelta:
+        """Merge an upstream payload, and the body it came in, into a history.
+
+        Safe to run in the executor: the columns being read meanwhile are
+        replaced, never changed, and the merges of the other histories
+        touch none of the state of this one.
+        """
+        history = self.histories[kind]
+        known_rows = len(history)
+        last_key = history.columns.keys[-1] if known_rows else None
+        delta = history.merge(payload, body)
+        if not delta:
+            return delta
+        self.version += 1
+
+        since = delta.since()
+        # Only the running totals from the oldest new record on change
+        row = 0
+        if since is not None:
+            row = bisect.bisect_left(history.columns.timestamps, since)
+        self.prefix_indexes[kind].update(history.columns, row)
+        if kind == HISTORY_REFUELLINGS:
+            self._update_refuelling_aggregator(since, known_rows, last_key)
+        elif since is None:
+            self.cost_aggregators[kind] = CostAggregator.from_columns(history.columns)
+        else:
+            for record in delta.added:
+                self.cost_aggregators[kind].feed(*history.columns.extract(record))
+        return delta
+
+    def _update_refuelling_aggregator(
+        self, since: int | None, known_rows: int, last_key: Hashable
+    ) -> None:
+        """Append new refuellings, or rebuild the aggregates if history changed."""
+        columns = self.refuellings.columns
+        if since is None:
+            self.refuelling_aggregator = RefuellingAggregator.from_columns(columns)
+            self.efficiency = EfficiencyEngine.from_columns(columns)
+            return
+
+        # Only the tank-to-tank segments from the oldest new refuelling on change
+        self.efficiency.update(columns, since)
+        if known_rows == 0 or columns.keys[known_rows - 1] == last_key:
+            # Every new refuelling landed after the known ones
+            for row in range(known_rows, len(columns)):
+                self.refuelling_aggregator.feed_row(columns, row)
+            return
+
+        self.refuelling_aggregator = RefuellingAggregator.from_columns(columns)
@@ -0,0 +1,294 @@
+"""Timings and counters of the requests and refreshes of a Drivvo account."""
+
+from __future__ import annotations
+
+import bisect
+from collections.abc import Callable, Iterator
+import contextlib
+import contextvars
+import dataclasses
+import re
+import time
+from typing import Any
+
+from .const import HISTOGRAM_WINDOW
+
+# Geometric bucket bounds, four per doubling from 1 ms to about 18 minutes
+_BUCKET_BOUNDS = tuple(0.001 * 2 ** (step / 4) for step in range(81))
+
+_PERCENTILES = (50, 95, 99)
+
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+STAGE_QUEUE = "queue"
+STAGE_LOGIN = "login"
+STAGE_NETWORK = "network"
+STAGE_DECODE = "decode"
+STAGE_MERGE = "merge"
+STAGE_AGGREGATE = "aggregate"
+STAGE_REFRESH = "refresh"
+
+_current_trace: contextvars.ContextVar[RefreshTrace | None] = contextvars.ContextVar(
+    "drivvo_refresh_trace", default=None
+)
+
+
+def endpoint_of(path: str) -> str:
+    """Return the endpoint of an API path, without the vehicle id."""
+    return _NUMERIC_SEGMENT.sub("/{id}", "/" + path.lstrip("/"))[1:]
+
+
+class Histogram:
+    """Rolling histogram of durations with a fixed memory footprint.
+
+    Samples are counted in geometric buckets, so a percentile is known
+    within about 20%. Two generations of HISTOGRAM_WINDOW samples are
+    kept, the percentiles describing the last one or two windows.
+    """
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW) -> None:
+        """Initialize an empty histogram."""
+        self.window = window
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._current = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self._previous = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self._current_count = 0
+
+    def add(self, value: float) -> None:
+        """Count a sample, in seconds."""
+        if self._current_count == self.window:
+            self._previous = self._current
+            self._current = [0] * (len(_BUCKET_BOUNDS) + 1)
+            self._current_count = 0
+        self._current[bisect.bisect_left(_BUCKET_BOUNDS, value)] += 1
+        self._current_count += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float | None:
+        """Return the upper bound of the bucket holding a percentile."""
+        counts = [a + b for a, b in zip(self._current, self._previous, strict=True)]
+        samples = sum(counts)
+        if samples == 0:
+            return None
+        rank = samples * percent / 100
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                if bucket == len(_BUCKET_BOUNDS):
+                    return self.max
+                return _BUCKET_BOUNDS[bucket]
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the summary of the histogram."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            **{f"p{percent}": self.percentile(percent) for percent in _PERCENTILES},
+        }
+
+
+@dataclasses.dataclass
+class EndpointStats:
+    """Requests sent to one endpoint."""
+
+    requests: int = 0
+    not_modified: int = 0
+    failures: int = 0
+    retries: int = 0
+    last_size: int = 0
+    total_size: int = 0
+    duration: Histogram = dataclasses.field(default_factory=Histogram)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stats in a JSON serializable form."""
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "retries": self.retries,
+            "last_size": self.last_size,
+            "total_size": self.total_size,
+            "duration": self.duration.as_dict(),
+        }
+
+
+@dataclasses.dataclass
+class RefreshTrace:
+    """What one refresh of a vehicle spent its time on."""
+
+    vehicle: str
+    duration: float | None = None
+    api_calls: int = 0
+    retries: int = 0
+    response_size: int = 0
+    stages: dict[str, float] = dataclasses.field(default_factory=dict)
+    records: dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        """Account for time spent in a stage."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class VehicleMetrics:
+    """Refreshes of one vehicle."""
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.refreshes = 0
+        self.last: RefreshTrace | None = None
+        self.duration = Histogram()
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener after every refresh, returning how to remove it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def record(self, trace: RefreshTrace) -> None:
+        """Account for a finished refresh."""
+        self.refreshes += 1
+        self.last = trace
+        self.duration.add(trace.duration)
+        for listener in list(self._listeners):
+            listener()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a JSON serializable form."""
+        return {
+            "refreshes": self.refreshes,
+            "last": dataclasses.asdict(self.last) if self.last is not None else None,
+            "duration": self.duration.as_dict(),
+        }
+
+
+class DrivvoMetrics:
+    """Timings and counters of everything one Drivvo account does.
+
+    Requests are accounted per endpoint, and time per stage of a refresh.
+    While a refresh of a vehicle is traced, its requests and stages are
+    also added to the trace of that refresh, including those made by the
+    tasks it spawns.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.retries = 0
+        self.stages: dict[str, Histogram] = {}
+        self.endpoints: dict[str, EndpointStats] = {}
+        self.vehicles: dict[str, VehicleMetrics] = {}
+
+    def vehicle(self, vehicle: str) -> VehicleMetrics:
+        """Return the metrics of a vehicle."""
+        metrics = self.vehicles.get(vehicle)
+        if metrics is None:
+            metrics = self.vehicles[vehicle] = VehicleMetrics()
+        return metrics
+
+    def _endpoint(self, path: str) -> EndpointStats:
+        """Return the stats of the endpoint of a path."""
+        endpoint = endpoint_of(path)
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    @contextlib.contextmanager
+    def trace(self, vehicle: str) -> Iterator[RefreshTrace]:
+        """Trace a refresh of a vehicle."""
+        trace = RefreshTrace(str(vehicle))
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - start
+            # Outside of the trace, so the total is not added to itself
+            self.record_stage(STAGE_REFRESH, trace.duration)
+            self.vehicle(trace.vehicle).record(trace)
+
+    @contextlib.contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        """Time a stage of the current refresh."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """Account for time spent in a stage, and in the current refresh."""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.add(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds)
+
+    def record_records(self, kind: str, count: int) -> None:
+        """Remember how many records a history of the current refresh holds."""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.records[kind] = count
+
+    def record_request(
+        self,
+        path: str,
+        seconds: float,
+        size: int = 0,
+        decode_time: float = 0.0,
+        not_modified: bool = False,
+    ) -> None:
+        """Account for a request the API answered."""
+        stats = self._endpoint(path)
+        stats.requests += 1
+        stats.duration.add(seconds)
+        if not_modified:
+            stats.not_modified += 1
+        else:
+            stats.last_size = size
+            stats.total_size += size
+        self.record_stage(STAGE_NETWORK, seconds - decode_time)
+        if decode_time:
+            self.record_stage(STAGE_DECODE, decode_time)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.api_calls += 1
+            trace.response_size += size
+
+    def record_failure(self, path: str, retrying: bool) -> None:
+        """Account for a request that failed, and whether it is retried."""
+        stats = self._endpoint(path)
+        stats.requests += 1
+        stats.failures += 1
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.api_calls += 1
+        if retrying:
+            self.retries += 1
+            stats.retries += 1
+            if trace is not None:
+                trace.retries += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a JSON serializable form."""
+        return {
+            "retries": self.retries,
+            "stages": {
+                stage: histogram.as_dict() for stage, histogram in self.stages.items()
+            },
+            "endpoints": {
+                endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()
+            },
+            "vehicles": {
+                vehicle: metrics.as_dict() for vehicle, metrics in self.vehicles.items()
+            },
+        }
@@ -0,0 +1,53 @@
+"""Decoding and debug logging of Drivvo API payloads."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any
+
+from .const import DEBUG_PAYLOAD_LIMIT, DECODE_EXECUTOR_THRESHOLD
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional fast path
+    orjson = None
+
+
+def decode_json(body: bytes) -> Any:
+    """Decode a JSON body, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+async def async_decode_json(body: bytes) -> tuple[Any, float]:
+    """Decode a JSON body, returning the data and the time spent decoding.
+
+    Empty bodies decode to None. Large bodies, such as the full history of
+    a vehicle, are decoded in the executor so they do not block the loop.
+    """
+    start = time.perf_counter()
+    if not body.strip():
+        data = None
+    elif len(body) < DECODE_EXECUTOR_THRESHOLD:
+        data = decode_json(body)
+    else:
+        data = await asyncio.get_running_loop().run_in_executor(None, decode_json, body)
+    return data, time.perf_counter() - start
+
+
+def log_payload(logger: logging.Logger, message: str, *args: Any) -> None:
+    """Log a message whose last argument is a payload, truncated.
+
+    The payload is only formatted when debug logging is enabled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    *args, payload = args
+    text = repr(payload)
+    if len(text) > DEBUG_PAYLOAD_LIMIT:
+        text = f"{text[:DEBUG_PAYLOAD_LIMIT]}... ({len(text)} characters)"
+    logger.debug(message, *args, text)
@@ -0,0 +1,38 @@
+"""Refresh scheduling based on how often a vehicle is used."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import random
+
+from .const import (
+    MAX_SCAN_INTERVAL,
+    MIN_SCAN_INTERVAL,
+    POLL_RATE_WINDOW,
+    POLLS_PER_EVENT,
+    SCAN_JITTER,
+)
+from .timeline import VehicleTimeline
+
+
+def jittered(interval: timedelta) -> timedelta:
+    """Spread an interval by SCAN_JITTER so refreshes do not line up."""
+    return interval * random.uniform(1 - SCAN_JITTER, 1 + SCAN_JITTER)
+
+
+def next_refresh_interval(timeline: VehicleTimeline, now: float) -> timedelta:
+    """Return when to refresh a vehicle again, from its recent event rate.
+
+    A vehicle is polled POLLS_PER_EVENT times per expected gap between
+    two of its events, so a car refuelled twice a week is refreshed much
+    more often than one that sat idle for months.
+    """
+    window = POLL_RATE_WINDOW.total_seconds()
+    events = len(timeline.between(int(now - window), int(now)))
+    if events == 0:
+        interval = MAX_SCAN_INTERVAL
+    else:
+        # A vehicle added recently is measured over its own history only
+        span = min(window, now - timeline.timestamps[0])
+        interval = timedelta(seconds=span / events / POLLS_PER_EVENT)
+    return max(MIN_SCAN_INTERVAL, min(MAX_SCAN_INTERVAL, jittered(interval)))
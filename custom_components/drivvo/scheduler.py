@@ -0,0 +1,156 @@
+"""Scheduling of the requests of every Drivvo account on the instance."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator, Hashable
+import contextlib
+import dataclasses
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    DATA_SCHEDULER,
+    SCHEDULER_ACCOUNT_CONCURRENCY,
+    SCHEDULER_CONCURRENCY,
+)
+from .instrumentation import Histogram
+
+
+@dataclasses.dataclass
+class _AccountQueue:
+    """Requests of one account, waiting or in flight."""
+
+    waiters: deque[asyncio.Future[None]] = dataclasses.field(default_factory=deque)
+    active: int = 0
+    wait: Histogram = dataclasses.field(default_factory=Histogram)
+
+
+class RequestScheduler:
+    """Limit the requests in flight to the Drivvo API, fairly across accounts.
+
+    At most concurrency requests are in flight overall, and at most
+    account_concurrency for one account. Free slots go to the accounts
+    with waiting requests in turn, so a large account queues behind its
+    own requests instead of starving the others.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        account_concurrency: int = SCHEDULER_ACCOUNT_CONCURRENCY,
+    ) -> None:
+        """Initialize an idle scheduler."""
+        self.concurrency = concurrency
+        self.account_concurrency = account_concurrency
+        self.active = 0
+        self.max_queued = 0
+        self.wait = Histogram()
+        self._accounts: dict[Hashable, _AccountQueue] = {}
+        # Accounts with waiting requests, in the order they are served
+        self._turns: deque[Hashable] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Return the number of waiting requests."""
+        return sum(
+            sum(not waiter.done() for waiter in queue.waiters)
+            for queue in self._accounts.values()
+        )
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self, account: Hashable) -> AsyncIterator[float]:
+        """Hold a request slot of an account, yielding the time waited for it."""
+        queue = self._accounts.get(account)
+        if queue is None:
+            queue = self._accounts[account] = _AccountQueue()
+        start = time.monotonic()
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+        if account not in self._turns:
+            self._turns.append(account)
+        self._dispatch()
+        if not waiter.done():
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before being cancelled
+                self._release(queue)
+            else:
+                waiter.cancel()
+                self._dispatch()
+            raise
+
+        waited = time.monotonic() - start
+        self.wait.add(waited)
+        queue.wait.add(waited)
+        try:
+            yield waited
+        finally:
+            self._release(queue)
+
+    def _grant(self, queue: _AccountQueue) -> None:
+        """Take a slot for an account."""
+        self.active += 1
+        queue.active += 1
+
+    def _release(self, queue: _AccountQueue) -> None:
+        """Give a slot back and hand it to the next waiting request."""
+        self.active -= 1
+        queue.active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand the free slots to the waiting accounts, in turn."""
+        skipped = 0
+        while self._turns and self.active < self.concurrency:
+            account = self._turns.popleft()
+            queue = self._accounts[account]
+            while queue.waiters and queue.waiters[0].done():
+                queue.waiters.popleft()
+            if not queue.waiters:
+                continue
+            if queue.active >= self.account_concurrency:
+                # Keep its turn, but let the other accounts through
+                self._turns.append(account)
+                skipped += 1
+                if skipped >= len(self._turns):
+                    return
+                continue
+            skipped = 0
+            self._grant(queue)
+            queue.waiters.popleft().set_result(None)
+            if queue.waiters:
+                self._turns.append(account)
+
+    def as_dict(self, account: Hashable | None = None) -> dict[str, Any]:
+        """Return the state of the scheduler, and of one account if given."""
+        data = {
+            "concurrency": self.concurrency,
+            "account_concurrency": self.account_concurrency,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "accounts": len(self._accounts),
+            "wait": self.wait.as_dict(),
+        }
+        queue = self._accounts.get(account)
+        if queue is not None:
+            data["account"] = {
+                "active": queue.active,
+                "queued": sum(not waiter.done() for waiter in queue.waiters),
+                "wait": queue.wait.as_dict(),
+            }
+        return data
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant) -> RequestScheduler:
+    """Return the request scheduler shared by every entry."""
+    return hass.data.setdefault(DATA_SCHEDULER, RequestScheduler())
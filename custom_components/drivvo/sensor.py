@@ -1,7 +1,5 @@
 import logging
 from typing import Any
-from datetime import datetime
-import pytz
 
 import voluptuous as vol
 
@@ -9,19 +7,17 @@ from homeassistant import config_entries, core
 from homeassistant.components.sensor import (
     PLATFORM_SCHEMA,
     SensorEntity,
-    SensorDeviceClass,
 )
-from homeassistant.const import STATE_UNKNOWN
+from homeassistant.exceptions import ConfigEntryAuthFailed
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.issue_registry import IssueSeverity, async_create_issue
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-)
+from homeassistant.helpers.update_coordinator import CoordinatorEntity, UpdateFailed
 
 from . import get_data_vehicle
+from .api import DrivvoApiError, DrivvoAuthError
+from .catalogue import async_get_catalogue, vehicle_identification
 from .const import (
     CONF_EMAIL,
     CONF_ID_VEHICLE,
@@ -30,9 +26,16 @@ from .const import (
     CONF_VEHICLES,
     DOMAIN,
     ICON,
-    SCAN_INTERVAL,
 )
-from .sensors import SENSOR_TYPES, DrivvoSensorEntityDescription
+from .coordinator import DrivvoAccount, DrivvoVehicleCoordinator
+from .history import VehicleHistory
+from .instrumentation import VehicleMetrics
+from .sensors import (
+    DIAGNOSTIC_SENSOR_TYPES,
+    SENSOR_TYPES,
+    DrivvoDiagnosticSensorEntityDescription,
+    DrivvoSensorEntityDescription,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -51,85 +54,154 @@ async def async_setup_entry(
     config_entry: config_entries.ConfigEntry,
     async_add_entities,
 ) -> None:
-    """Setup sensor platform."""
-    config = hass.data[DOMAIN][config_entry.entry_id]
-    entities = []
+    """Setup sensor platform.
+
+    Entities are created right away from what is known of each vehicle:
+    its last snapshot, or its entry in the vehicle catalogue. They stay
+    unavailable until the first refresh, which runs in the background. A
+    vehicle known from neither gets its entities once its data arrives.
+    """
+    account: DrivvoAccount = hass.data[DOMAIN][config_entry.entry_id]
+    config = account.config
+    catalogue = {
+        str(vehicle["id_veiculo"]): vehicle
+        for vehicle in async_get_catalogue(hass).get(account.session.email) or []
+    }
 
-    # Make sure we have a place to store coordinators
-    hass.data.setdefault(f"{DOMAIN}_coordinators", {})
+    def _setup_vehicle(vehicle: str) -> list[SensorEntity]:
+        """Create the coordinator of one vehicle, and its entities if known."""
 
-    for vehicle in config[CONF_VEHICLES]:
-        # Create a unique update method for this specific vehicle
-        async def _update_for_vehicle(vehicle_id=vehicle):
-            return await get_data_vehicle(
-                hass,
-                user=config[CONF_EMAIL],
-                password=config[CONF_PASSWORD],
-                id_vehicle=vehicle_id,
-            )
+        history = account.histories.setdefault(vehicle, VehicleHistory())
 
-        # Get initial data for the vehicle
-        vehicle_data = await get_data_vehicle(
-            hass,
-            user=config[CONF_EMAIL],
-            password=config[CONF_PASSWORD],
-            id_vehicle=vehicle,
+        async def _update_for_vehicle():
+            previous = history.snapshot
+            try:
+                with account.session.metrics.trace(vehicle):
+                    vehicle_data = await get_data_vehicle(
+                        account.session,
+                        id_vehicle=vehicle,
+                        currency=account.currency,
+                        history=history,
+                    )
+            except DrivvoAuthError as err:
+                raise ConfigEntryAuthFailed("Invalid authentication") from err
+            except DrivvoApiError as err:
+                raise UpdateFailed(
+                    f"Error fetching Drivvo vehicle {vehicle}: {err}"
+                ) from err
+
+            if vehicle_data is None:
+                async_create_issue(
+                    hass,
+                    DOMAIN,
+                    f"{vehicle}_vehicle_non_existent",
+                    is_fixable=False,
+                    severity=IssueSeverity.WARNING,
+                    translation_key="vehicle_non_existent",
+                    translation_placeholders={
+                        "vehicle": vehicle,
+                    },
+                )
+            elif vehicle_data is not previous:
+                account.async_schedule_save()
+                account.async_schedule_backfill(vehicle, vehicle_data)
+            return vehicle_data
+
+        # Create coordinator for data updates
+        coordinator = DrivvoVehicleCoordinator(
+            hass, f"Drivvo {vehicle}", history, _update_for_vehicle
         )
 
-        if vehicle_data is not None:
-            # Create coordinator for data updates
-            coordinator = DataUpdateCoordinator(
-                hass,
-                _LOGGER,
-                name=f"Drivvo {vehicle_data.identification}",
-                update_interval=SCAN_INTERVAL,
-                update_method=_update_for_vehicle,
+        # Store coordinator to prevent garbage collection
+        account.vehicle_coordinators[vehicle] = coordinator
+
+        if history.snapshot is not None:
+            # Serve the cached data until the first refresh revalidates it
+            coordinator.async_set_updated_data(history.snapshot)
+            return _vehicle_entities(
+                account,
+                coordinator,
+                vehicle,
+                history.snapshot.identification,
+                history.snapshot.manufacturer,
+                history.snapshot.model,
             )
 
-            # Store coordinator to prevent garbage collection
-            hass.data[f"{DOMAIN}_coordinators"][vehicle] = coordinator
-
-            # Fetch initial data
-            await coordinator.async_config_entry_first_refresh()
-
-            # Create sensor entities
-            for description in SENSOR_TYPES:
-                if description.key == "vehicle":
-                    model = vehicle_data.model
-                    entities.append(
-                        DrivvoSensorEntity(
-                            coordinator,
-                            description,
-                            vehicle_data.id,
-                            vehicle_data.identification,
-                            model,
-                        )
-                    )
-                else:
-                    entities.append(
-                        DrivvoSensorEntity(
-                            coordinator,
-                            description,
-                            vehicle_data.id,
-                            vehicle_data.identification,
-                        )
-                    )
-        else:
-            async_create_issue(
-                hass,
-                DOMAIN,
-                f"{vehicle}_vehicle_non_existent",
-                is_fixable=False,
-                severity=IssueSeverity.WARNING,
-                translation_key="vehicle_non_existent",
-                translation_placeholders={
-                    "vehicle": vehicle,
-                },
+        if vehicle in catalogue:
+            api_vehicle = catalogue[vehicle]
+            return _vehicle_entities(
+                account,
+                coordinator,
+                vehicle,
+                vehicle_identification(api_vehicle),
+                api_vehicle["marca"],
+                api_vehicle["modelo"],
+            )
+
+        @core.callback
+        def _async_add_when_fetched() -> None:
+            """Add the entities once the vehicle data is known."""
+            vehicle_data = coordinator.data
+            if vehicle_data is None:
+                return
+            remove_listener()
+            async_add_entities(
+                _vehicle_entities(
+                    account,
+                    coordinator,
+                    vehicle,
+                    vehicle_data.identification,
+                    vehicle_data.manufacturer,
+                    vehicle_data.model,
+                )
             )
 
+        remove_listener = coordinator.async_add_listener(_async_add_when_fetched)
+        return []
+
+    entities = []
+    for vehicle in config[CONF_VEHICLES]:
+        entities.extend(_setup_vehicle(vehicle))
+
     async_add_entities(entities)
 
 
+def _vehicle_entities(
+    account: DrivvoAccount,
+    coordinator: DrivvoVehicleCoordinator,
+    vehicle: str,
+    identification: str,
+    manufacturer: str,
+    model: str,
+) -> list[SensorEntity]:
+    """Create the sensor entities of one vehicle."""
+    coordinator.name = f"Drivvo {identification}"
+
+    entities: list[SensorEntity] = [
+        DrivvoSensorEntity(
+            coordinator,
+            description,
+            vehicle,
+            identification,
+            f"{manufacturer} {model}",
+            model if description.key == "vehicle" else None,
+        )
+        for description in SENSOR_TYPES
+    ]
+    metrics = account.session.metrics.vehicle(vehicle)
+    entities.extend(
+        DrivvoDiagnosticSensorEntity(
+            coordinator,
+            description,
+            vehicle,
+            identification,
+            metrics,
+        )
+        for description in DIAGNOSTIC_SENSOR_TYPES
+    )
+    return entities
+
+
 async def async_setup_platform(
     hass: core.HomeAssistant,
     config: dict[str, Any],
@@ -168,12 +240,15 @@ class DrivvoSensorEntity(CoordinatorEntity, SensorEntity):
 
     entity_description: DrivvoSensorEntityDescription
 
+    coordinator: DrivvoVehicleCoordinator
+
     def __init__(
         self,
-        coordinator: DataUpdateCoordinator,
+        coordinator: DrivvoVehicleCoordinator,
         description: DrivvoSensorEntityDescription,
         vehicle_id: str,
         vehicle_name: str,
+        device_model: str,
         model: str = None,
     ) -> None:
         """Initialize the sensor entity."""
@@ -182,6 +257,7 @@ class DrivvoSensorEntity(CoordinatorEntity, SensorEntity):
         self._vehicle_id = vehicle_id
         self._vehicle_name = vehicle_name
         self._model = model
+        self._last_available: bool | None = None
 
         # Set unique ID
         self._attr_unique_id = f"{vehicle_id}_{description.key}"
@@ -195,54 +271,107 @@ class DrivvoSensorEntity(CoordinatorEntity, SensorEntity):
             identifiers={(DOMAIN, vehicle_id)},
             name=vehicle_name,
             manufacturer="Drivvo",
-            model=f"{coordinator.data.manufacturer} {coordinator.data.model}",
+            model=device_model,
             sw_version="2.0.0",
         )
 
-    @property
-    def native_value(self) -> Any:
-        """Return the sensor value."""
-        if self.coordinator.data is None:
-            return STATE_UNKNOWN
-
-        if self.entity_description.key == "vehicle" and self._model:
-            return self._model
-
-        try:
-            if self.entity_description.value_fn:
-                value = self.entity_description.value_fn(self.coordinator.data)
-
-                # Convert string timestamps to datetime objects with timezone
-                if (
-                    self.entity_description.device_class == SensorDeviceClass.TIMESTAMP
-                    and isinstance(value, str)
-                ):
-                    try:
-                        # Parse the datetime string and make it timezone-aware
-                        dt_obj = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
-                        return dt_obj.replace(tzinfo=pytz.UTC)
-                    except ValueError as e:
-                        _LOGGER.error(f"Error parsing timestamp '{value}': {e}")
-                        return STATE_UNKNOWN
-
-                return value
-        except (KeyError, AttributeError) as e:
-            _LOGGER.error(f"Error getting value for {self.entity_description.key}: {e}")
-            return STATE_UNKNOWN
-
-        return STATE_UNKNOWN
-
-    @property
-    def icon(self) -> str:
-        """Return the icon."""
-        return self.entity_description.icon or ICON
+        self._attr_icon = description.icon or ICON
+        self._update_from_data()
 
     @property
-    def native_unit_of_measurement(self) -> str | None:
-        """Return the unit of measurement of this entity."""
+    def available(self) -> bool:
+        """Return True once the vehicle data was fetched."""
+        return super().available and self.coordinator.data is not None
+
+    @core.callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if the fields it depends on changed."""
+        fields = self.entity_description.fields
+        available = self.available
         if (
-            self.coordinator.data is not None
-            and self.entity_description.unit_fn is not None
+            fields is not None
+            and available == self._last_available
+            and self.coordinator.changed_fields.isdisjoint(fields)
         ):
-            return self.entity_description.unit_fn(self.coordinator.data)
-        return self.entity_description.native_unit_of_measurement
+            return
+        self._last_available = available
+        self._update_from_data()
+        super()._handle_coordinator_update()
+
+    def _update_from_data(self) -> None:
+        """Read the precomputed value and unit from the snapshot."""
+        data = self.coordinator.data
+        description = self.entity_description
+        if data is None:
+            self._attr_native_value = None
+        elif description.key == "vehicle":
+            # Its value_fn takes the model too; an empty model shows as unknown
+            self._attr_native_value = self._model or None
+        elif description.value_fn is not None:
+            self._attr_native_value = description.value_fn(data)
+
+        if data is not None and description.unit_fn is not None:
+            self._attr_native_unit_of_measurement = description.unit_fn(data)
+        if data is not None and description.attributes_fn is not None:
+            self._attr_extra_state_attributes = description.attributes_fn(data)
+
+
+class DrivvoDiagnosticSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensor reporting on the refreshes of a Drivvo vehicle.
+
+    Unchanged data does not notify the coordinator listeners, so the state
+    is written when the metrics of the vehicle record a refresh instead;
+    coordinator updates only write a change of availability.
+    """
+
+    entity_description: DrivvoDiagnosticSensorEntityDescription
+
+    coordinator: DrivvoVehicleCoordinator
+
+    def __init__(
+        self,
+        coordinator: DrivvoVehicleCoordinator,
+        description: DrivvoDiagnosticSensorEntityDescription,
+        vehicle_id: str,
+        vehicle_name: str,
+        metrics: VehicleMetrics,
+    ) -> None:
+        """Initialize the sensor entity."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._metrics = metrics
+        self._last_available: bool | None = None
+        self._attr_unique_id = f"{vehicle_id}_{description.key}"
+        self._attr_has_entity_name = True
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, vehicle_id)})
+        self._update_from_metrics()
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the refreshes of the vehicle."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._metrics.add_listener(self._handle_metrics_update))
+
+    @core.callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the availability if it changed, the rest is left to metrics."""
+        available = self.available
+        if available != self._last_available:
+            self._last_available = available
+            self.async_write_ha_state()
+
+    @core.callback
+    def _handle_metrics_update(self) -> None:
+        """Write the state of the last refresh."""
+        self._update_from_metrics()
+        self.async_write_ha_state()
+
+    def _update_from_metrics(self) -> None:
+        """Read the value and attributes from the last refresh."""
+        description = self.entity_description
+        if self._metrics.last is None:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = {}
+            return
+        self._attr_native_value = description.value_fn(self._metrics)
+        if description.attributes_fn is not None:
+            self._attr_extra_state_attributes = description.attributes_fn(self._metrics)
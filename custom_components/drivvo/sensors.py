@@ -3,7 +3,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Callable, Optional
+from datetime import timedelta
+from typing import Any, Callable, Optional
 
 from homeassistant.components.sensor import (
     SensorEntityDescription,
@@ -11,12 +12,17 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.const import (
+    EntityCategory,
     UnitOfLength,
+    UnitOfTime,
     UnitOfVolume,
 )
 
 from . import DrivvoDataVehicle
-from .units import UnitOfFuelEfficiency
+from .analytics import window_key
+from .const import ANALYTICS_WINDOWS
+from .efficiency import efficiency_attributes, efficiency_unit
+from .instrumentation import VehicleMetrics
 
 
 @dataclass
@@ -25,6 +31,17 @@ class DrivvoSensorEntityDescription(SensorEntityDescription):
 
     value_fn: Optional[Callable] = None
     unit_fn: Callable[[DrivvoDataVehicle], str] | None = None
+    attributes_fn: Callable[[DrivvoDataVehicle], dict[str, Any]] | None = None
+    # Snapshot fields read by value_fn and unit_fn; None means any field
+    fields: tuple[str, ...] | None = None
+
+
+@dataclass
+class DrivvoDiagnosticSensorEntityDescription(SensorEntityDescription):
+    """Class describing Drivvo sensors of the refreshes of a vehicle."""
+
+    value_fn: Callable[[VehicleMetrics], Any] | None = None
+    attributes_fn: Callable[[VehicleMetrics], dict[str, Any]] | None = None
 
 
 SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
@@ -35,6 +52,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         icon="mdi:counter",
         state_class=SensorStateClass.TOTAL,
         value_fn=lambda data: data.refuelling_total,
+        fields=("refuelling_total",),
     ),
     DrivvoSensorEntityDescription(
         key="vehicle",
@@ -42,6 +60,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Vehicle",
         icon="mdi:car",
         value_fn=lambda data, model: model,
+        fields=(),
     ),
     DrivvoSensorEntityDescription(
         key="odometer",
@@ -52,6 +71,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL_INCREASING,
         native_unit_of_measurement=UnitOfLength.KILOMETERS,
         value_fn=lambda data: data.odometer,
+        fields=("odometer",),
     ),
     DrivvoSensorEntityDescription(
         key="odometer_date",
@@ -60,6 +80,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         icon="mdi:calendar",
         device_class=SensorDeviceClass.TIMESTAMP,
         value_fn=lambda data: data.odometer_date,
+        fields=("odometer_date",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_last_average",
@@ -67,8 +88,10 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling Last Average",
         icon="mdi:fuel",
         state_class=SensorStateClass.MEASUREMENT,
-        native_unit_of_measurement=UnitOfFuelEfficiency.KILOMETERS_PER_LITER,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
         value_fn=lambda data: data.refuelling_last_average,
+        fields=("refuelling_last_average", "distance_unit"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -77,8 +100,58 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling General Average",
         icon="mdi:fuel",
         state_class=SensorStateClass.MEASUREMENT,
-        native_unit_of_measurement=UnitOfFuelEfficiency.KILOMETERS_PER_LITER,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
         value_fn=lambda data: data.refuelling_general_average,
+        fields=("refuelling_general_average", "distance_unit"),
+        suggested_display_precision=2,
+    ),
+    DrivvoSensorEntityDescription(
+        key="refuelling_efficiency_best",
+        translation_key="refuelling_efficiency_best",
+        name="Refuelling Efficiency Best",
+        icon="mdi:fuel",
+        state_class=SensorStateClass.MEASUREMENT,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
+        value_fn=lambda data: data.refuelling_efficiency_best,
+        fields=("refuelling_efficiency_best", "distance_unit"),
+        suggested_display_precision=2,
+    ),
+    DrivvoSensorEntityDescription(
+        key="refuelling_efficiency_worst",
+        translation_key="refuelling_efficiency_worst",
+        name="Refuelling Efficiency Worst",
+        icon="mdi:fuel",
+        state_class=SensorStateClass.MEASUREMENT,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
+        value_fn=lambda data: data.refuelling_efficiency_worst,
+        fields=("refuelling_efficiency_worst", "distance_unit"),
+        suggested_display_precision=2,
+    ),
+    DrivvoSensorEntityDescription(
+        key="refuelling_efficiency_median",
+        translation_key="refuelling_efficiency_median",
+        name="Refuelling Efficiency Median",
+        icon="mdi:fuel",
+        state_class=SensorStateClass.MEASUREMENT,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
+        value_fn=lambda data: data.refuelling_efficiency_median,
+        fields=("refuelling_efficiency_median", "distance_unit"),
+        suggested_display_precision=2,
+    ),
+    DrivvoSensorEntityDescription(
+        key="refuelling_efficiency_rolling",
+        translation_key="refuelling_efficiency_rolling",
+        name="Refuelling Efficiency Rolling",
+        icon="mdi:fuel",
+        state_class=SensorStateClass.MEASUREMENT,
+        unit_fn=lambda data: efficiency_unit(data.distance_unit),
+        attributes_fn=lambda data: efficiency_attributes(data.distance_unit),
+        value_fn=lambda data: data.refuelling_efficiency_rolling,
+        fields=("refuelling_efficiency_rolling", "distance_unit"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -87,6 +160,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling Station",
         icon="mdi:gas-station",
         value_fn=lambda data: data.refuelling_station,
+        fields=("refuelling_station",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_type",
@@ -94,6 +168,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling Type",
         icon="mdi:gas-station",
         value_fn=lambda data: data.refuelling_type,
+        fields=("refuelling_type",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_reason",
@@ -101,6 +176,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling Reason",
         icon="mdi:information-outline",
         value_fn=lambda data: data.refuelling_reason,
+        fields=("refuelling_reason",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_date",
@@ -109,6 +185,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         icon="mdi:calendar",
         device_class=SensorDeviceClass.TIMESTAMP,
         value_fn=lambda data: data.refuelling_date,
+        fields=("refuelling_date",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_odometer",
@@ -118,6 +195,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.DISTANCE,
         native_unit_of_measurement=UnitOfLength.KILOMETERS,
         value_fn=lambda data: data.refuelling_odometer,
+        fields=("refuelling_odometer",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_value",
@@ -128,6 +206,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL,
         unit_fn=lambda data: data.currency,
         value_fn=lambda data: data.refuelling_value,
+        fields=("refuelling_value", "currency"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -138,6 +217,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.MONETARY,
         unit_fn=lambda data: data.currency,
         value_fn=lambda data: data.refuelling_price,
+        fields=("refuelling_price", "currency"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -149,6 +229,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL,
         unit_fn=lambda data: data.currency,
         value_fn=lambda data: data.refuelling_value_total,
+        fields=("refuelling_value_total", "currency"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -157,6 +238,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         name="Refuelling Tank Full",
         icon="mdi:gas-station",
         value_fn=lambda data: data.refuelling_tank_full,
+        fields=("refuelling_tank_full",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_distance",
@@ -167,6 +249,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         native_unit_of_measurement=UnitOfLength.KILOMETERS,
         value_fn=lambda data: data.refuelling_distance,
+        fields=("refuelling_distance",),
     ),
     DrivvoSensorEntityDescription(
         key="refuelling_price_lowest",
@@ -176,6 +259,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.MONETARY,
         unit_fn=lambda data: data.currency,
         value_fn=lambda data: data.refuelling_price_lowest,
+        fields=("refuelling_price_lowest", "currency"),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -187,6 +271,7 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL,
         native_unit_of_measurement=UnitOfVolume.LITERS,
         value_fn=lambda data: data.refuelling_volume,
+        fields=("refuelling_volume",),
         suggested_display_precision=2,
     ),
     DrivvoSensorEntityDescription(
@@ -198,6 +283,165 @@ SENSOR_TYPES: tuple[DrivvoSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL,
         native_unit_of_measurement=UnitOfVolume.LITERS,
         value_fn=lambda data: data.refuelling_volume_total,
+        fields=("refuelling_volume_total",),
+        suggested_display_precision=2,
+    ),
+)
+
+
+def _cost_sensor_types(
+    prefix: str, name: str, icon: str
+) -> tuple[DrivvoSensorEntityDescription, ...]:
+    """Return the descriptions of the service or expense metrics."""
+    return (
+        DrivvoSensorEntityDescription(
+            key=f"{prefix}_total",
+            translation_key=f"{prefix}_total",
+            name=f"{name} Total",
+            icon="mdi:counter",
+            state_class=SensorStateClass.TOTAL,
+            value_fn=lambda data: getattr(data, f"{prefix}_total"),
+            attributes_fn=lambda data: getattr(data, f"{prefix}_category_counts"),
+            fields=(f"{prefix}_total", f"{prefix}_category_counts"),
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"{prefix}_value_total",
+            translation_key=f"{prefix}_value_total",
+            name=f"{name} Value Total",
+            icon="mdi:cash",
+            device_class=SensorDeviceClass.MONETARY,
+            state_class=SensorStateClass.TOTAL,
+            unit_fn=lambda data: data.currency,
+            value_fn=lambda data: getattr(data, f"{prefix}_value_total"),
+            attributes_fn=lambda data: getattr(data, f"{prefix}_category_values"),
+            fields=(f"{prefix}_value_total", f"{prefix}_category_values", "currency"),
+            suggested_display_precision=2,
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"{prefix}_date",
+            translation_key=f"{prefix}_date",
+            name=f"{name} Date",
+            icon="mdi:calendar",
+            device_class=SensorDeviceClass.TIMESTAMP,
+            value_fn=lambda data: getattr(data, f"{prefix}_date"),
+            fields=(f"{prefix}_date",),
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"{prefix}_value",
+            translation_key=f"{prefix}_value",
+            name=f"{name} Value",
+            icon="mdi:cash",
+            device_class=SensorDeviceClass.MONETARY,
+            unit_fn=lambda data: data.currency,
+            value_fn=lambda data: getattr(data, f"{prefix}_value"),
+            fields=(f"{prefix}_value", "currency"),
+            suggested_display_precision=2,
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"{prefix}_type",
+            translation_key=f"{prefix}_type",
+            name=f"{name} Type",
+            icon=icon,
+            value_fn=lambda data: getattr(data, f"{prefix}_type"),
+            fields=(f"{prefix}_type",),
+        ),
+    )
+
+
+SENSOR_TYPES += _cost_sensor_types("service", "Service", "mdi:wrench")
+SENSOR_TYPES += _cost_sensor_types("expense", "Expense", "mdi:receipt")
+
+
+def _window_sensor_types(
+    window: timedelta,
+) -> tuple[DrivvoSensorEntityDescription, ...]:
+    """Return the descriptions of the analytics of a rolling window."""
+    key = window_key(window)
+    placeholders = {"days": str(window.days)}
+    return (
+        DrivvoSensorEntityDescription(
+            key=f"spend_{key}",
+            translation_key="spend_window",
+            translation_placeholders=placeholders,
+            name=f"Spend {window.days} Days",
+            icon="mdi:cash",
+            device_class=SensorDeviceClass.MONETARY,
+            unit_fn=lambda data: data.currency,
+            value_fn=lambda data: data.analytics.get(f"spend_{key}"),
+            fields=("analytics", "currency"),
+            suggested_display_precision=2,
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"distance_{key}",
+            translation_key="distance_window",
+            translation_placeholders=placeholders,
+            name=f"Distance {window.days} Days",
+            icon="mdi:road",
+            device_class=SensorDeviceClass.DISTANCE,
+            state_class=SensorStateClass.MEASUREMENT,
+            unit_fn=lambda data: data.distance_unit or UnitOfLength.KILOMETERS,
+            value_fn=lambda data: data.analytics.get(f"distance_{key}"),
+            fields=("analytics", "distance_unit"),
+        ),
+        DrivvoSensorEntityDescription(
+            key=f"cost_per_distance_{key}",
+            translation_key="cost_per_distance_window",
+            translation_placeholders=placeholders,
+            name=f"Cost Per Distance {window.days} Days",
+            icon="mdi:cash-marker",
+            state_class=SensorStateClass.MEASUREMENT,
+            unit_fn=lambda data: (
+                f"{data.currency}/{data.distance_unit or UnitOfLength.KILOMETERS}"
+                if data.currency
+                else None
+            ),
+            value_fn=lambda data: data.analytics.get(f"cost_per_distance_{key}"),
+            fields=("analytics", "currency", "distance_unit"),
+            suggested_display_precision=2,
+        ),
+    )
+
+
+# The snapshot holds the analytics of every window, computed in one pass
+SENSOR_TYPES += tuple(
+    description
+    for window in ANALYTICS_WINDOWS
+    for description in _window_sensor_types(window)
+)
+
+DIAGNOSTIC_SENSOR_TYPES: tuple[DrivvoDiagnosticSensorEntityDescription, ...] = (
+    DrivvoDiagnosticSensorEntityDescription(
+        key="refresh_duration",
+        translation_key="refresh_duration",
+        name="Refresh Duration",
+        icon="mdi:timer-outline",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
         suggested_display_precision=2,
+        value_fn=lambda metrics: metrics.last.duration,
+        attributes_fn=lambda metrics: {
+            "stages": metrics.last.stages,
+            "p50": metrics.duration.percentile(50),
+            "p95": metrics.duration.percentile(95),
+            "p99": metrics.duration.percentile(99),
+        },
+    ),
+    DrivvoDiagnosticSensorEntityDescription(
+        key="refresh_api_calls",
+        translation_key="refresh_api_calls",
+        name="Refresh API Calls",
+        icon="mdi:api",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: metrics.last.api_calls,
+        attributes_fn=lambda metrics: {
+            "retries": metrics.last.retries,
+            "response_size": metrics.last.response_size,
+            "records": metrics.last.records,
+        },
     ),
 )
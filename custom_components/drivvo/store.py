@@ -0,0 +1,118 @@
+"""Persistent cache of the Drivvo vehicle histories."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_STORES, DOMAIN, STORAGE_SAVE_DELAY, STORAGE_VERSION
+from .history import VehicleHistory
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _DrivvoHistoryStore(Store[dict[str, Any]]):
+    """Store of the vehicle histories."""
+
+    async def _async_migrate_func(
+        self, old_major_version: int, old_minor_version: int, old_data: dict
+    ) -> dict[str, Any]:
+        """Drop caches written in an older layout; they are refetched."""
+        return {}
+
+
+class DrivvoStore:
+    """Save the histories and last results of an account's vehicles.
+
+    Entities are populated from this cache at startup while a background
+    refresh revalidates it, so a restart does not wait on the API.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the store."""
+        self._hass = hass
+        self._store = _DrivvoHistoryStore(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self._histories: dict[str, VehicleHistory] = {}
+        self._save_pending = False
+
+    async def async_load(
+        self, snapshot_factory: Callable[[dict], Any]
+    ) -> dict[str, VehicleHistory]:
+        """Load the saved vehicle histories.
+
+        Rebuilding the aggregates of a history reads all its rows, so it
+        runs in the executor rather than holding up the event loop.
+        """
+        data = await self._store.async_load()
+        if data is None:
+            return {}
+        return await self._hass.async_add_executor_job(
+            _restore_histories, data, snapshot_factory
+        )
+
+    @callback
+    def async_schedule_save(self, histories: dict[str, VehicleHistory]) -> None:
+        """Save the histories after a delay, coalescing bursts of changes."""
+        self._histories = histories
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    async def async_flush(self) -> None:
+        """Write a scheduled save right away, cancelling its delay."""
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the data to write."""
+        self._save_pending = False
+        return {
+            "vehicles": {
+                vehicle: history.as_dict()
+                for vehicle, history in self._histories.items()
+            }
+        }
+
+    async def async_remove(self) -> None:
+        """Delete the saved data, cancelling any write still scheduled."""
+        self._save_pending = False
+        await self._store.async_remove()
+
+
+def _restore_histories(
+    data: dict[str, Any], snapshot_factory: Callable[[dict], Any]
+) -> dict[str, VehicleHistory]:
+    """Rebuild the vehicle histories of saved data, dropping unreadable ones."""
+    histories = {}
+    for vehicle, stored in data.get("vehicles", {}).items():
+        try:
+            histories[vehicle] = VehicleHistory.from_dict(stored, snapshot_factory)
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning(
+                "Discarding cached data of Drivvo vehicle %s: %s", vehicle, err
+            )
+    return histories
+
+
+@callback
+def async_get_store(hass: HomeAssistant, entry_id: str) -> DrivvoStore:
+    """Return the store of a config entry, shared across its reloads.
+
+    A delayed write belongs to the Store instance that scheduled it, so
+    removing the entry has to go through the same instance to cancel it.
+    """
+    stores: dict[str, DrivvoStore] = hass.data.setdefault(DATA_STORES, {})
+    store = stores.get(entry_id)
+    if store is None:
+        store = stores[entry_id] = DrivvoStore(hass, entry_id)
+    return store
+
+
+async def async_remove_store(hass: HomeAssistant, entry_id: str) -> None:
+    """Delete the saved data of a removed config entry."""
+    await async_get_store(hass, entry_id).async_remove()
+    hass.data[DATA_STORES].pop(entry_id)
@@ -0,0 +1,75 @@
+"""Date ordered index of every event of a vehicle."""
+
+from __future__ import annotations
+
+from array import array
+import bisect
+import heapq
+from collections.abc import Iterable
+
+from .columns import HistoryColumns, odometer_value
+
+
+class VehicleTimeline:
+    """Refuellings, services and expenses of a vehicle merged by date.
+
+    Each history already keeps its rows in date order, so the timeline is
+    a k-way merge of their (timestamp, odometer) columns. Date lookups
+    bisect the timestamps; odometer lookups use a sorted index that is
+    only built the first time it is needed.
+    """
+
+    def __init__(self, histories: Iterable[HistoryColumns]) -> None:
+        """Merge the columns of the histories into a single timeline."""
+        self.timestamps = array("q")
+        self.odometers = array("q")
+        # On equal dates the first history wins, as it is merged in last
+        for timestamp, odometer in heapq.merge(
+            *(
+                zip(columns.timestamps, columns.odometers, strict=True)
+                for columns in reversed(list(histories))
+            ),
+            key=lambda event: event[0],
+        ):
+            self.timestamps.append(timestamp)
+            self.odometers.append(odometer)
+        self._odometer_order: list[int] | None = None
+        self._sorted_odometers: array | None = None
+
+    def __len__(self) -> int:
+        """Return the number of events."""
+        return len(self.timestamps)
+
+    @property
+    def latest(self) -> tuple[int, int | None] | None:
+        """Return the timestamp and odometer of the most recent event."""
+        if not self.timestamps:
+            return None
+        return self.timestamps[-1], odometer_value(self.odometers[-1])
+
+    def between(self, start: int, end: int) -> range:
+        """Return the rows of the events dated from start to end, inclusive."""
+        return range(
+            bisect.bisect_left(self.timestamps, start),
+            bisect.bisect_right(self.timestamps, end),
+        )
+
+    def odometer_at(self, timestamp: int) -> int | None:
+        """Return the odometer of the last event dated at or before timestamp."""
+        row = bisect.bisect_right(self.timestamps, timestamp)
+        if row == 0:
+            return None
+        return odometer_value(self.odometers[row - 1])
+
+    def with_odometer_between(self, low: int, high: int) -> list[int]:
+        """Return the rows of the events with an odometer from low to high."""
+        if self._odometer_order is None:
+            self._odometer_order = sorted(
+                range(len(self.odometers)), key=self.odometers.__getitem__
+            )
+            self._sorted_odometers = array(
+                "q", (self.odometers[row] for row in self._odometer_order)
+            )
+        start = bisect.bisect_left(self._sorted_odometers, low)
+        stop = bisect.bisect_right(self._sorted_odometers, high)
+        return sorted(self._odometer_order[start:stop])
@@ -0,0 +1,103 @@
+"""Rate limiting, retries and circuit breaking for Drivvo requests."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import random
+import time
+from collections.abc import Mapping
+
+from .const import RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+
+
+class TokenBucket:
+    """Limit the request rate of an account, allowing short bursts."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def async_acquire(self) -> None:
+        """Wait for a token; waiters are served in arrival order."""
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class CircuitBreaker:
+    """Stop calling the API after repeated failures.
+
+    After failure_threshold failures in a row the circuit opens for
+    reset_timeout seconds and requests fail fast. Once it elapses requests
+    are let through again, and the next failure reopens it immediately.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        """Initialize a closed circuit."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while requests must not be sent."""
+        return time.monotonic() < self._open_until
+
+    @property
+    def retry_in(self) -> float:
+        """Return the seconds left until the circuit lets requests through."""
+        return max(0.0, self._open_until - time.monotonic())
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        self.failures = 0
+        self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit past the threshold."""
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open(self.reset_timeout)
+
+    def open(self, duration: float) -> None:
+        """Open the circuit for at least the given number of seconds."""
+        self._open_until = max(self._open_until, time.monotonic() + duration)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Return the wait before a retry, with full jitter."""
+    base = RETRY_BACKOFF_BASE.total_seconds()
+    cap = RETRY_BACKOFF_MAX.total_seconds()
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """Return the delay asked for by a Retry-After header, in seconds."""
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())